@@ -1,26 +1,52 @@
 import logging
 import argparse
 import os
+import sys
+import time
 from pathlib import Path
-from tba_types_generator import generate, DEFAULT_OUTPUT_DIR
+from tba_types_generator import DEFAULT_OUTPUT_DIR
 
 HARMONY_VERSIONS = [20, 21, 22, 24]
 SBPRO_VERSIONS = [20, 22, 24]
 
 
-def generate_all():
-    generate_host("harmony")
-    generate_host("storyboardpro")
+def generate_all(session=None, jobs=1, force=False):
+    # One session for every target, so preambles, overrides and caches are
+    # shared, and prettier runs once for the whole build.
+    return build(_host_targets("harmony") + _host_targets("storyboardpro"), session, jobs, force)
 
 
-def generate_host(host):
+def generate_host(host, session=None, jobs=1, force=False):
+    return build(_host_targets(host), session, jobs, force)
+
+
+def build(targets, session=None, jobs=1, force=False):
+    """
+    Build the targets (in `jobs` processes) and log a per-target report.
+    Targets that are up to date are skipped unless `force` is set.
+    Returns False if any target failed.
+    """
+    from tba_types_generator.session import format_report
+
+    session = session or _new_session()
+    start = time.perf_counter()
+    results = session.build(targets, jobs=jobs, force=force)
+    logging.getLogger(__name__).info("\n" + format_report(results, time.perf_counter() - start))
+    return not any(result.error for result in results)
+
+
+def _host_targets(host):
     if host == "harmony":
         version_nums = HARMONY_VERSIONS
     else:
         version_nums = SBPRO_VERSIONS
+    return [(host, version_num) for version_num in version_nums]
+
+
+def _new_session():
+    from tba_types_generator.session import GeneratorSession
 
-    for version_num in version_nums:
-        generate(host, version_num)
+    return GeneratorSession()
 
 
 if __name__ == "__main__":
@@ -29,14 +55,90 @@ if __name__ == "__main__":
     parser.add_argument("--host", choices=["harmony", "storyboardpro"])
     parser.add_argument("--version", type=int)
     parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, type=Path)
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Build this many targets at once, in separate processes",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild every target, even those whose inputs haven't changed",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        help="Revalidate cached pages older than this many seconds (default: never)",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Revalidate every cached page; only changed pages are downloaded",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        help="Parse doc pages in this many worker processes",
+    )
+    parser.add_argument(
+        "--html-parser",
+        choices=["html.parser", "lxml"],
+        help="BeautifulSoup backend (default: html.parser); lxml is faster but needs the 'fast' extra",
+    )
+    parser.add_argument(
+        "--parse-engine",
+        choices=["bs4", "stream"],
+        help="Engine for doxygen class pages (stream: tree-free, no BeautifulSoup)",
+    )
+    parser.add_argument(
+        "--layout",
+        choices=["single", "split"],
+        help="single: one index.d.ts (default); split: one file per class, referenced from index.d.ts",
+    )
+    parser.add_argument(
+        "--formatter",
+        choices=["prettier", "native"],
+        help="prettier: run npx prettier on the output (default); native: format in process, no Node needed",
+    )
+    parser.add_argument(
+        "--check-format",
+        action="store_true",
+        help="With --formatter native, check the output with prettier",
+    )
+    parser.add_argument(
+        "--no-examples",
+        action="store_true",
+        help="Leave @example blocks out of the generated declarations",
+    )
     args = parser.parse_args()
     os.environ["TBA_TYPES_OUTPUT_DIR"] = str(args.output_dir)
+    if args.no_examples:
+        os.environ["TBA_TYPES_EXAMPLES"] = "0"
+    if args.layout:
+        os.environ["TBA_TYPES_LAYOUT"] = args.layout
+    if args.formatter:
+        os.environ["TBA_TYPES_FORMATTER"] = args.formatter
+    if args.check_format:
+        os.environ["TBA_TYPES_CHECK_FORMAT"] = "1"
+    if args.html_parser:
+        os.environ["TBA_TYPES_HTML_PARSER"] = args.html_parser
+    if args.parse_engine:
+        os.environ["TBA_TYPES_PARSE_ENGINE"] = args.parse_engine
+    if args.parse_workers is not None:
+        os.environ["TBA_TYPES_PARSE_WORKERS"] = str(args.parse_workers)
+    if args.refresh:
+        os.environ["TBA_TYPES_CACHE_TTL"] = "0"
+    elif args.cache_ttl is not None:
+        os.environ["TBA_TYPES_CACHE_TTL"] = str(args.cache_ttl)
     logging.basicConfig(level=logging.DEBUG)
     # generate_all()
+    ok = True
     if args.host:
         if args.version:
-            generate(args.host, args.version)
+            ok = build([(args.host, args.version)], force=args.force)
         else:
-            generate_host(args.host)
+            ok = generate_host(args.host, jobs=args.jobs, force=args.force)
     elif not (args.host or args.version):
-        generate_all()
+        ok = generate_all(jobs=args.jobs, force=args.force)
+    sys.exit(0 if ok else 1)
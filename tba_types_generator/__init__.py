@@ -1,15 +1,17 @@
 import os
-import json5
+import re
 import typing
 from pathlib import Path
 
-from .typescript_builder import write_ts_from_class, write_ts_from_interface
+from .fragment_cache import render_class_cached
+from .model import ClassInfo, Member
+from .typescript_builder import render_interface
 import subprocess
-from .parser.tba_parser import get_classes as get_core_classes
-from .parser.tba_extended_parser import get_classes as get_extended_classes
-from .parser.tba_extended_parser import get_globals as get_extended_globals
 import logging
 
+# The parsers (bs4, esprima, jsbeautifier) and json5 are imported on first
+# use, so importing the package and `generate.py --help` stay cheap.
+
 logger = logging.getLogger(__name__)
 SKIP_CLASSES = [
     "QObject",
@@ -24,14 +26,40 @@ SKIP_CLASSES = [
 
 
 DEFAULT_OUTPUT_DIR = Path(__file__).parent.parent / "dist" / "tba-types"
+# single: everything in index.d.ts.  split: one file per class under
+# CLASS_DIR, referenced from index.d.ts, so editors re-check less.
+OUTPUT_LAYOUTS = ("single", "split")
+CLASS_DIR = "classes"
+# prettier: run `npx prettier` on each output.  native: format in process
+# (ts_format), optionally checked with prettier (TBA_TYPES_CHECK_FORMAT=1).
+FORMATTERS = ("prettier", "native")
+PRETTIER_OPTIONS = ["--object-wrap", "collapse", "--trailing-comma", "none"]
+WRITE_WORKERS = 8
 
 
 def _get_output_dir():
     return Path(os.environ.get("TBA_TYPES_OUTPUT_DIR", DEFAULT_OUTPUT_DIR))
 
 
-def _load_extra_ts_files():
-    override_dir = "./override"
+def get_target_dir(host: str, version_num: int, output_dir: typing.Optional[Path] = None) -> Path:
+    return (output_dir or _get_output_dir()) / host / str(version_num)
+
+
+def get_layout() -> str:
+    layout = os.environ.get("TBA_TYPES_LAYOUT", OUTPUT_LAYOUTS[0])
+    if layout not in OUTPUT_LAYOUTS:
+        raise ValueError(f"Unknown output layout {layout!r}, expected one of {OUTPUT_LAYOUTS}")
+    return layout
+
+
+def get_formatter() -> str:
+    formatter = os.environ.get("TBA_TYPES_FORMATTER", FORMATTERS[0])
+    if formatter not in FORMATTERS:
+        raise ValueError(f"Unknown formatter {formatter!r}, expected one of {FORMATTERS}")
+    return formatter
+
+
+def _load_extra_ts_files(override_dir: str = "./override"):
     data = {}
     for filename in os.listdir(override_dir):
         root, ext = os.path.splitext(filename)
@@ -42,26 +70,75 @@ def _load_extra_ts_files():
     return data
 
 
-def prettify(filename):
+def _prettier_command(*args: str) -> typing.List[str]:
     import sys
 
-    logger.info(f"Prettifying {filename}")
     if sys.platform == "win32":
         npx_bin = "C:\\Program Files\\nodejs\\npx.cmd"
     else:
         npx_bin = "npx"
-    subprocess.call(
-        [
-            npx_bin,
-            "prettier",
-            "--object-wrap",
-            "collapse",
-            "--trailing-comma",
-            "none",
-            "--write",
-            filename,
-        ]
-    )
+    return [npx_bin, "prettier", *PRETTIER_OPTIONS, *args]
+
+
+def prettify(*filenames) -> bool:
+    """
+    Format files (or directories) in place with one prettier run.  Returns
+    False if prettier failed.
+    """
+    logger.info(f"Prettifying {', '.join(map(str, filenames))}")
+    if subprocess.call(_prettier_command("--write", *map(str, filenames))) != 0:
+        logger.error("prettier failed")
+        return False
+    return True
+
+
+def check_format_enabled() -> bool:
+    return os.environ.get("TBA_TYPES_CHECK_FORMAT", "0") != "0"
+
+
+def check_format(*filenames) -> bool:
+    """
+    Ask prettier whether natively formatted output matches its own; it
+    lists any file that doesn't.
+    """
+    names = ", ".join(map(str, filenames))
+    logger.info(f"Checking the formatting of {names} with prettier")
+    if subprocess.call(_prettier_command("--check", *map(str, filenames))) != 0:
+        logger.warning(f"Native formatting of {names} differs from prettier")
+        return False
+    return True
+
+
+def format_outputs(paths: typing.Sequence[str]) -> bool:
+    """
+    Run prettier once over everything written: formats with the prettier
+    formatter, checks with the native one (if enabled).  Starting Node is
+    the expensive part, so builds batch their outputs into one call.
+    Returns False if prettier failed to format the files.
+    """
+    paths = list(dict.fromkeys(paths))
+    if not paths:
+        return True
+    if get_formatter() == "prettier":
+        return prettify(*paths)
+    if check_format_enabled():
+        check_format(*paths)
+    return True
+
+
+def _format_native(text: str, what: str) -> str:
+    from .ts_format import FormatError, format_typescript
+
+    try:
+        return format_typescript(text)
+    except FormatError as e:
+        # Like prettier, leave what can't be parsed as it is.
+        logger.warning(f"Leaving {what} unformatted: {e}")
+        return text
+
+
+def _collapse_blank_lines(text: str) -> str:
+    return re.sub(r"\n{3,}", "\n\n", text)
 
 
 def prettify_alt(filename):
@@ -75,53 +152,161 @@ def prettify_alt(filename):
         f.write(new_js)
 
 
+def _class_filename(class_data: ClassInfo, used: typing.Set[str]) -> str:
+    """
+    A file name for a class in the split layout, unique even on
+    case-insensitive file systems.
+    """
+    stem = class_data.name
+    if class_data.namespace:
+        stem = f"{class_data.namespace}.{stem}"
+    filename = f"{stem}.d.ts"
+    n = 1
+    while filename.lower() in used:
+        n += 1
+        filename = f"{stem}_{n}.d.ts"
+    used.add(filename.lower())
+    return filename
+
+
+def _write_files(
+    files: typing.Dict[str, str],
+    previous_files: typing.Optional[typing.Dict[str, dict]] = None,
+    rendered: typing.Optional[typing.Dict[str, str]] = None,
+) -> typing.List[str]:
+    """
+    Write the files, except those rendered the same as last time (see
+    manifest.py) and not touched since.  The hash of what was rendered goes
+    into `rendered`; returns the paths actually written.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from .manifest import file_hash
+    from .page_store import content_hash
+
+    previous_files = previous_files or {}
+
+    def _write(item):
+        path, text = item
+        digest = content_hash(text)
+        if rendered is not None:
+            rendered[path] = digest
+        previous = previous_files.get(path)
+        if previous and previous["rendered"] == digest and file_hash(path) == previous["output"]:
+            return None
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as executor:
+        return [path for path in executor.map(_write, files.items()) if path is not None]
+
+
 def _generate_ts_from_data(
     host: str,
     version_num: str,
-    all_classes: typing.Iterator[dict],
-    all_globals: typing.Iterator[dict],
+    all_classes: typing.Iterator[ClassInfo],
+    all_globals: typing.Iterator[Member],
+    extra_file_data: typing.Optional[typing.Dict[str, str]] = None,
+    output_dir: typing.Optional[Path] = None,
+    layout: typing.Optional[str] = None,
+    format_paths: typing.Optional[typing.List[str]] = None,
+    previous_files: typing.Optional[typing.Dict[str, dict]] = None,
+    rendered: typing.Optional[typing.Dict[str, str]] = None,
 ):
-    extra_file_data = _load_extra_ts_files()
-
-    ts_dir = _get_output_dir() / host / str(version_num)
+    """
+    Write the declarations for one target.  With the "split" layout every
+    class goes to its own file under classes/, referenced from index.d.ts.
+    If `format_paths` is given, what needs prettier is added to it for the
+    caller to pass to format_outputs(), rather than formatted right away.
+    `previous_files` and `rendered` are the "files" of the previous build
+    manifest and of the next one (see _write_files).
+    Returns the path of index.d.ts.
+    """
+    if extra_file_data is None:
+        extra_file_data = _load_extra_ts_files()
+    layout = layout or get_layout()
+
+    ts_dir = get_target_dir(host, version_num, output_dir)
     ts_dir.mkdir(parents=True, exist_ok=True)
     ts_filename = os.path.join(ts_dir, "index.d.ts")
+    class_dir = ts_dir / CLASS_DIR
     logger.info(f"Writing to {ts_filename}")
-    with open(ts_filename, "w") as ts_file:
-        ts_file.write(extra_file_data["preamble"])
-        if host == "harmony":
-            if version_num >= 16:
-                logger.debug("Writing Harmony addons for >= 16")
-                ts_file.write("\n")
-                ts_file.write(extra_file_data["preamble_harmony16up"])
-            if version_num >= 24:
-                logger.debug("Writing Harmony addons for >= 24")
-                ts_file.write("\n")
-                ts_file.write(extra_file_data["preamble_harmony24up"])
-        if host == "storyboardpro":
-            logger.debug("Writing addons for Storyboard Pro")
-            ts_file.write("\n")
-            ts_file.write(extra_file_data["preamble_sbpro"])
-        ts_file.write("\n\n\n")
-
-        for class_data in all_classes:
-            if class_data["name"] in SKIP_CLASSES:
-                continue
-            logger.debug(f"Writing class: {class_data['name']}")
-            write_ts_from_class(class_data, ts_file)
-
-        for global_data in all_globals:
-            write_ts_from_interface(global_data, ts_file)
-
-        ts_file.write("\n\n\n")
-        if host == "harmony":
-            logger.debug("Writing harmony-specific add-ons")
-            ts_file.write(extra_file_data["harmony_post"])
-
-            if version_num >= 20:
-                ts_file.write(extra_file_data["preamble_harmony_extended"])
-
-    prettify(ts_filename)
+    formatter = get_formatter()
+    # Rendered into memory and written as one block (or one block per file);
+    # the largest versions come to a few MB.
+    head = [extra_file_data["preamble"]]
+    if host == "harmony":
+        if version_num >= 16:
+            logger.debug("Writing Harmony addons for >= 16")
+            head += ["\n", extra_file_data["preamble_harmony16up"]]
+        if version_num >= 24:
+            logger.debug("Writing Harmony addons for >= 24")
+            head += ["\n", extra_file_data["preamble_harmony24up"]]
+    if host == "storyboardpro":
+        logger.debug("Writing addons for Storyboard Pro")
+        head += ["\n", extra_file_data["preamble_sbpro"]]
+
+    class_files: typing.Dict[str, str] = {}
+    classes: typing.List[str] = []
+    used_filenames: typing.Set[str] = set()
+    for class_data in all_classes:
+        if class_data.name in SKIP_CLASSES:
+            continue
+        logger.debug(f"Writing class: {class_data.name}")
+        fragment = render_class_cached(class_data)
+        if formatter == "native":
+            fragment = _format_native(fragment, class_data.name)
+        if layout == "split":
+            filename = _class_filename(class_data, used_filenames)
+            class_files[str(class_dir / filename)] = fragment
+        else:
+            classes.append(fragment)
+
+    globals_ts = "".join(render_interface(global_data) for global_data in all_globals)
+
+    tail = []
+    if host == "harmony":
+        logger.debug("Writing harmony-specific add-ons")
+        tail.append(extra_file_data["harmony_post"])
+
+        if version_num >= 20:
+            tail.append(extra_file_data["preamble_harmony_extended"])
+
+    if class_files:
+        # Triple-slash directives only count at the top of a file (the
+        # preamble starts with its own).
+        head[:0] = [
+            f'/// <reference path="./{CLASS_DIR}/{os.path.basename(path)}" />\n'
+            for path in class_files
+        ]
+        class_dir.mkdir(exist_ok=True)
+    if formatter == "native":
+        # The preambles and add-ons are kept formatted in the repo.
+        parts = [_collapse_blank_lines("".join(head))]
+        parts += classes
+        parts.append(_format_native(globals_ts, "globals"))
+        parts.append(_collapse_blank_lines("".join(tail)))
+        index_ts = "\n\n".join(p.strip("\n") for p in parts if p.strip()) + "\n"
+    else:
+        index_ts = "".join(head + ["\n\n\n"] + classes + [globals_ts, "\n\n\n"] + tail)
+
+    # Files left over from an earlier split build would still be picked up
+    # by a tsconfig that includes the whole directory.
+    if class_dir.is_dir():
+        for path in class_dir.glob("*.d.ts"):
+            if str(path) not in class_files:
+                path.unlink()
+    files = {ts_filename: index_ts, **class_files}
+    written = _write_files(files, previous_files, rendered)
+    if len(written) == len(files) > 1:
+        # Shorter than listing every class file.
+        written = [str(ts_dir)]
+    if format_paths is not None:
+        format_paths.extend(written)
+    else:
+        format_outputs(written)
+    return ts_filename
 
 
 # def _iter_class_jsons(version):
@@ -139,69 +324,45 @@ def _generate_ts_from_data(
 
 
 def get_all_classes_with_overrides(host, version_num):
-    with open("./override/override.jsonc", "rb") as f:
-        override_data = json5.load(f)
+    from .overrides import load_overrides
 
+    overrides = load_overrides()
     for data in get_all_classes(host, version_num):
-        if data["name"] in override_data["classes"]:
-            override = override_data["classes"][data["name"]]
-            if "skip" in override:
-                continue
-            for key, val in override.items():
-                if key == "add_slots":
-                    for slot in val:
-                        data["slots"].append(slot)
-                elif key == "add_props":
-                    for prop in val:
-                        data["props"].append(prop)
-                else:
-                    data[key] = val
-            logger.debug(f"Applying override: {override}")
-
-        for slot in data["slots"]:
-            if slot["name"] in override_data["slots"]:
-                slot_override = override_data["slots"][slot["name"]]
-                if "class_name" in slot_override and slot_override["class_name"] != data["name"]:
-                    continue
-                for key in slot_override:
-                    if key not in ("params"):
-                        logger.debug("Overriding slot: {0}".format(slot_override))
-                        slot[key] = slot_override[key]
-                if "params" in slot_override:
-                    if slot_override.get("replace_params", False):
-                        slot["params"] = slot_override["params"]
-                    else:
-                        for param in slot["params"]:
-                            param_override = next(
-                                (p for p in slot_override["params"] if p["name"] == param["name"]),
-                                None,
-                            )
-                            if param_override:
-                                logger.debug("Overriding param: {}:{}".format(slot["name"], param_override))
-                                param.update(param_override)
-        yield data
-
-
-def get_all_classes(host, version_num):
-    yield from get_core_classes(host, version_num)
+        if overrides.apply(data):
+            yield data
+
+
+def get_all_classes(host, version_num, failures=None) -> typing.Iterator[ClassInfo]:
+    """
+    The parsed classes, as ClassInfo.  Extended doc classes that fail to
+    load are skipped and added to `failures` (as ClassFailure) if given.
+    """
+    from .parser.tba_parser import get_classes as get_core_classes
+    from .parser.tba_extended_parser import get_classes as get_extended_classes
+
+    for data in get_core_classes(host, version_num):
+        yield ClassInfo.from_dict(data)
     if host == "harmony" and version_num >= 20:
-        yield from get_extended_classes(version_num)
+        for data in get_extended_classes(version_num, failures):
+            yield ClassInfo.from_dict(data)
 
 
-def get_all_globals(host, version_num):
+def get_all_globals(host, version_num) -> typing.List[Member]:
+    from .parser.tba_extended_parser import get_globals as get_extended_globals
+
     if host == "harmony" and version_num >= 20:
-        return get_extended_globals(version_num)
+        return [Member.from_dict(data) for data in get_extended_globals(version_num)]
     return []
 
 
 def generate(host, version_num):
-    logger.info(f"Generating Typescript for {host}:{version_num}")
-    _generate_ts_from_data(
-        host,
-        version_num,
-        get_all_classes_with_overrides(host, version_num),
-        get_all_globals(host, version_num),
-    )
+    """
+    Generate one target with the default GeneratorSession, so repeated
+    calls share preambles, overrides and caches.
+    """
+    from .session import get_default_session
+
+    return get_default_session().generate(host, version_num)
 
 
 # def generate_from_json():
@@ -0,0 +1,46 @@
+import logging
+import os
+import typing
+
+from .model import ClassInfo, Member
+from .page_store import content_hash, get_store
+
+logger = logging.getLogger(__name__)
+
+# Doxygen code fragments are stored raw by the parser and only beautified
+# when they are written out; the same snippets repeat across versions, so
+# results are memoized in memory and in the page store.
+_beautified: typing.Dict[str, str] = {}
+
+
+def examples_enabled() -> bool:
+    return os.environ.get("TBA_TYPES_EXAMPLES", "1") != "0"
+
+
+def beautify_example(code: str) -> str:
+    digest = content_hash(code)
+    cached = _beautified.get(digest)
+    if cached is None:
+        import jsbeautifier
+
+        store = get_store()
+        memo_key = f"beautify:{jsbeautifier.__version__}:{digest}"
+        cached = store.get_memo(memo_key)
+        if cached is None:
+            cached = jsbeautifier.beautify(code)
+            store.put_memo(memo_key, cached)
+        _beautified[digest] = cached
+    return cached
+
+
+def get_example(obj: typing.Union[ClassInfo, Member]) -> str:
+    """
+    The example to emit for a class or member, or "" if there is none (or
+    examples are turned off).
+    """
+    example = obj.example
+    if not example or not examples_enabled():
+        return ""
+    if obj.beautify_example:
+        example = beautify_example(example)
+    return example
@@ -0,0 +1,46 @@
+import hashlib
+import logging
+import pickle
+import typing
+
+from .examples import examples_enabled
+from .model import ClassInfo, as_tuple
+from .typescript_builder import CLASS_BODY_KEYS, render_class_body, render_class_header
+
+logger = logging.getLogger(__name__)
+
+# (examples flag, body key) -> rendered class body.  Most classes have the
+# same members in every Harmony/SBPro version, so a multi-version build only
+# renders the bodies that changed.  Headers are always rendered: they link to
+# the class page of their own version.
+#
+# Kept in memory only: the builder code can't change during a run, and
+# reading a fragment back from the page store costs about as much as
+# rendering it.
+_bodies: typing.Dict[typing.Tuple[bool, bytes], str] = {}
+
+
+def class_body_key(cls: ClassInfo) -> bytes:
+    """
+    A hash of everything the class body is rendered from.  Pickling is
+    several times faster than json.dumps, and equal pickles always mean
+    equal data; at worst, a shared string pickled as a reference costs a
+    cache miss.
+    """
+    values = [getattr(cls, key) for key in CLASS_BODY_KEYS]
+    values = [tuple(map(as_tuple, value)) if isinstance(value, list) else value for value in values]
+    return hashlib.sha256(pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL)).digest()
+
+
+def render_class_cached(cls: ClassInfo) -> str:
+    """
+    render_class(cls), reusing the body rendered for an identical class
+    earlier in this run.
+    """
+    key = (examples_enabled(), class_body_key(cls))
+    body = _bodies.get(key)
+    if body is None:
+        body = _bodies[key] = render_class_body(cls)
+    else:
+        logger.debug(f"Reusing rendered class: {cls.name}")
+    return render_class_header(cls) + body
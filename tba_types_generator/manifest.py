@@ -0,0 +1,106 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import typing
+from pathlib import Path
+
+from .overrides import Overrides
+from .page_store import content_hash, get_store
+
+logger = logging.getLogger(__name__)
+
+# Bump when the manifest layout changes.
+MANIFEST_VERSION = 1
+
+# Build manifests record what one output directory was generated from:
+#   code:      generator source and output settings
+#   overrides: override.jsonc
+#   preambles: the override/*.ts files
+#   pages:     url -> page digest for every page read
+#   files:     path -> {"rendered": hash of what was written,
+#                       "output": hash of the file after formatting}
+# They are kept in the page store rather than next to the output, so they
+# don't end up in the published package.
+
+
+@functools.cache
+def _source_version() -> str:
+    h = hashlib.sha256()
+    package_dir = Path(__file__).parent
+    for path in sorted(package_dir.rglob("*.py")):
+        h.update(path.relative_to(package_dir).as_posix().encode())
+        h.update(path.read_bytes())
+    return h.hexdigest()[:16]
+
+
+def get_code_version() -> str:
+    """
+    The generator code plus every setting that changes its output.
+    """
+    from . import get_formatter, get_layout
+    from .examples import examples_enabled
+    from .parse_cache import get_parser_version
+
+    settings = [get_parser_version(), get_layout(), get_formatter(), str(examples_enabled())]
+    return f"{_source_version()}-{content_hash(':'.join(settings))[:16]}"
+
+
+def file_hash(path: typing.Union[str, Path]) -> typing.Optional[str]:
+    try:
+        with open(path, "r") as f:
+            return content_hash(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def get_inputs(overrides: Overrides, extra_ts_files: typing.Dict[str, str]) -> typing.Dict[str, str]:
+    """
+    Everything a manifest records except pages and files.  The overrides
+    and preambles are hashed as given, i.e. as the build applies them,
+    rather than read from disk again.
+    """
+    return {
+        "code": get_code_version(),
+        "overrides": overrides.digest,
+        "preambles": content_hash(json.dumps(extra_ts_files, sort_keys=True)),
+    }
+
+
+def _memo_key(ts_dir: typing.Union[str, Path]) -> str:
+    return f"manifest:{MANIFEST_VERSION}:{os.path.realpath(ts_dir)}"
+
+
+def load_manifest(ts_dir: typing.Union[str, Path]) -> typing.Optional[dict]:
+    cached = get_store().get_memo(_memo_key(ts_dir))
+    return json.loads(cached) if cached is not None else None
+
+
+def save_manifest(ts_dir: typing.Union[str, Path], manifest: dict):
+    get_store().put_memo(_memo_key(ts_dir), json.dumps(manifest, sort_keys=True))
+
+
+def is_up_to_date(manifest: typing.Optional[dict], inputs: typing.Dict[str, str]) -> bool:
+    """
+    Whether regenerating would give the files the manifest describes: same
+    code, overrides and preambles, every page unchanged (revalidated only
+    as the cache TTL asks), and every file still as it was written.
+    """
+    from .url_getter import get_page_digest
+
+    if manifest is None:
+        return False
+    for key, value in inputs.items():
+        if manifest.get(key) != value:
+            logger.debug(f"Out of date: {key} changed")
+            return False
+    for path, hashes in manifest["files"].items():
+        if file_hash(path) != hashes["output"]:
+            logger.debug(f"Out of date: {path} is missing or was edited")
+            return False
+    for url, digest in manifest["pages"].items():
+        if get_page_digest(url) != digest:
+            logger.debug(f"Out of date: {url} changed")
+            return False
+    return True
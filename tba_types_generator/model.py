@@ -0,0 +1,182 @@
+import dataclasses
+import functools
+import logging
+import operator
+import sys
+import typing
+
+logger = logging.getLogger(__name__)
+
+# What the builder works from.  The parsers still return plain dicts (that is
+# what the parse memo stores as JSON); get_all_classes() turns them into these
+# models, dropping the keys nothing reads (enums, constructor, keyword, ...).
+# Type names and identifiers repeat all over a multi-version build, so they
+# are interned.
+#
+# Optional fields are None when the doc page (or override) didn't give them,
+# which the builder tells apart from "" (e.g. an empty "desc" still gets a doc
+# comment line).
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class _Model:
+    """
+    from_dict() and patch() adapt the plain-dict data of the parsers and
+    override.jsonc: keys map to fields, nested lists become models.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data: typing.Dict[str, typing.Any]):
+        converters = _CONVERTERS[cls]
+        fields = _field_names(cls)
+        kwargs = {}
+        for key, value in data.items():
+            if key in converters:
+                kwargs[key] = converters[key](value)
+            elif key in fields:
+                kwargs[key] = value
+        return cls(**kwargs)
+
+    def patch(self, data: typing.Dict[str, typing.Any]):
+        """
+        Like dict.update(): set every key of `data` on this object.
+        """
+        converters = _CONVERTERS[type(self)]
+        fields = _field_names(type(self))
+        for key, value in data.items():
+            if key not in fields:
+                logger.warning(f"Ignoring unknown key {key!r} for {type(self).__name__}")
+                continue
+            if key in converters:
+                value = converters[key](value)
+            setattr(self, key, value)
+
+
+@functools.cache
+def _field_names(cls) -> typing.FrozenSet[str]:
+    return frozenset(f.name for f in dataclasses.fields(cls))
+
+
+@dataclasses.dataclass(slots=True)
+class SchemaField(_Model):
+    """
+    A field of an object type (a markdown or jsdoc properties table).
+    """
+
+    name: str = ""
+    type: str = ""
+    desc: typing.Optional[str] = None
+    object_schema: typing.Optional[typing.List["SchemaField"]] = None
+
+
+@dataclasses.dataclass(slots=True)
+class Param(_Model):
+    name: str = ""
+    type: str = ""
+    desc: typing.Optional[str] = None
+    default: typing.Optional[str] = None
+    object_schema: typing.Optional[typing.List[SchemaField]] = None
+
+
+@dataclasses.dataclass(slots=True)
+class Member(_Model):
+    """
+    A slot, signal or property; also the global interfaces of the extended
+    docs (a name, a description and an object_schema).
+    """
+
+    name: str = ""
+    type: str = ""
+    desc: typing.Optional[str] = None
+    params: typing.List[Param] = dataclasses.field(default_factory=list)
+    object_schema: typing.Optional[typing.List[SchemaField]] = None
+    url: typing.Optional[str] = None
+    note: typing.Optional[str] = None
+    example: typing.Optional[str] = None
+    beautify_example: bool = False
+    invalid: bool = False
+    is_static: bool = False
+
+
+@dataclasses.dataclass(slots=True)
+class ClassInfo(_Model):
+    name: str = ""
+    parent: typing.Optional[str] = None
+    namespace: typing.Optional[str] = None
+    is_namespace: bool = False
+    desc: typing.Optional[str] = None
+    url: typing.Optional[str] = None
+    note: typing.Optional[str] = None
+    example: typing.Optional[str] = None
+    beautify_example: bool = False
+    slots: typing.List[Member] = dataclasses.field(default_factory=list)
+    signals: typing.List[Member] = dataclasses.field(default_factory=list)
+    props: typing.List[Member] = dataclasses.field(default_factory=list)
+
+    def extend(self, key: str, values: typing.List[typing.Dict[str, typing.Any]]):
+        """
+        Append members given as dicts to the `key` list ("slots", ...).
+        """
+        getattr(self, key).extend(_members(values))
+
+
+def as_tuple(obj: _Model) -> tuple:
+    """
+    The field values of a model as nested tuples, e.g. to hash it: pickling
+    these is several times faster than pickling the objects.
+    """
+    getter, nested = _LAYOUTS[type(obj)]
+    values = getter(obj)
+    converted = None
+    for i in nested:
+        if values[i]:
+            if converted is None:
+                converted = list(values)
+            converted[i] = tuple(map(as_tuple, values[i]))
+    return values if converted is None else tuple(converted)
+
+
+def _schema(values):
+    return None if values is None else [SchemaField.from_dict(v) for v in values]
+
+
+def _params(values):
+    return [Param.from_dict(v) for v in values]
+
+
+def _members(values):
+    return [Member.from_dict(v) for v in values]
+
+
+_CONVERTERS: typing.Dict[type, typing.Dict[str, typing.Callable]] = {
+    SchemaField: {"name": _intern, "type": _intern, "object_schema": _schema},
+    Param: {"name": _intern, "type": _intern, "object_schema": _schema},
+    Member: {"name": _intern, "type": _intern, "params": _params, "object_schema": _schema},
+    ClassInfo: {
+        "name": _intern,
+        "parent": _intern,
+        "namespace": _intern,
+        "slots": _members,
+        "signals": _members,
+        "props": _members,
+    },
+}
+
+
+def _layout(cls, nested: typing.Sequence[str]):
+    names = [f.name for f in dataclasses.fields(cls)]
+    return operator.attrgetter(*names), tuple(names.index(name) for name in nested)
+
+
+# Model -> (getter for every field, positions of the fields holding models).
+_LAYOUTS = {
+    SchemaField: _layout(SchemaField, ["object_schema"]),
+    Param: _layout(Param, ["object_schema"]),
+    Member: _layout(Member, ["params", "object_schema"]),
+    ClassInfo: _layout(ClassInfo, ["slots", "signals", "props"]),
+}
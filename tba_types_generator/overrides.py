@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import threading
+import typing
+
+from .model import ClassInfo
+from .page_store import content_hash, get_store
+
+logger = logging.getLogger(__name__)
+
+OVERRIDE_PATH = "./override/override.jsonc"
+# Bump when the compiled layout below changes.
+COMPILED_VERSION = 3
+# Slot override keys that steer how the override applies, rather than
+# being copied onto the slot.
+SLOT_DIRECTIVES = ("params", "replace_params", "class_name")
+
+
+def compile_overrides(override_data: dict) -> dict:
+    """
+    Turn override.jsonc into lookup tables:
+      skip:    class names to leave out
+      classes: class -> ordered [op, key, value] ("add" extends a list,
+               "set" replaces a key)
+      slots:   slot -> {class_name (only if given), set, params,
+               replace_params}
+      params:  slot -> param -> patch (first match wins)
+    The result is plain JSON so it can be stored as is.
+    """
+    compiled = {"skip": [], "classes": {}, "slots": {}, "params": {}}
+    for class_name, override in override_data.get("classes", {}).items():
+        if "skip" in override:
+            compiled["skip"].append(class_name)
+            continue
+        ops = []
+        for key, val in override.items():
+            if key == "add_slots":
+                ops.append(["add", "slots", val])
+            elif key == "add_props":
+                ops.append(["add", "props", val])
+            else:
+                ops.append(["set", key, val])
+        compiled["classes"][class_name] = ops
+
+    for slot_name, slot_override in override_data.get("slots", {}).items():
+        compiled["slots"][slot_name] = {
+            "set": {k: v for k, v in slot_override.items() if k not in SLOT_DIRECTIVES},
+            "params": slot_override.get("params"),
+            "replace_params": bool(slot_override.get("replace_params", False)),
+        }
+        if "class_name" in slot_override:
+            compiled["slots"][slot_name]["class_name"] = slot_override["class_name"]
+        if "params" in slot_override and not slot_override.get("replace_params", False):
+            param_patches = {}
+            for param in slot_override["params"]:
+                param_patches.setdefault(param["name"], param)
+            compiled["params"][slot_name] = param_patches
+    return compiled
+
+
+class Overrides:
+    """
+    Compiled overrides, applied to one parsed class at a time.  Keys patch
+    the fields of the same name (see ClassInfo.patch()), and values become
+    new model objects on the way in, so classes never share (or mutate)
+    override data.  `digest` is the content hash of the override.jsonc text
+    they were compiled from (see manifest.get_inputs).
+    """
+
+    def __init__(self, compiled: dict, digest: str = ""):
+        self.digest = digest
+        self.skip = frozenset(compiled["skip"])
+        self.classes: typing.Dict[str, list] = compiled["classes"]
+        self.slots: typing.Dict[str, dict] = compiled["slots"]
+        self.params: typing.Dict[str, typing.Dict[str, dict]] = compiled["params"]
+
+    def apply(self, data: ClassInfo) -> bool:
+        """
+        Apply the overrides to a class in place.  Returns False if the class
+        should be skipped.
+        """
+        class_name = data.name
+        if class_name in self.skip:
+            return False
+        ops = self.classes.get(class_name)
+        if ops:
+            for op, key, val in ops:
+                if op == "add":
+                    data.extend(key, val)
+                else:
+                    data.patch({key: val})
+            logger.debug(f"Applying override: {class_name}")
+
+        for slot in data.slots:
+            slot_override = self.slots.get(slot.name)
+            if slot_override is None:
+                continue
+            if "class_name" in slot_override and slot_override["class_name"] != class_name:
+                continue
+            if slot_override["set"]:
+                logger.debug("Overriding slot: {0}".format(slot.name))
+                slot.patch(slot_override["set"])
+            if slot_override["params"] is None:
+                continue
+            if slot_override["replace_params"]:
+                slot.patch({"params": slot_override["params"]})
+                continue
+            param_patches = self.params[slot.name]
+            for param in slot.params:
+                param_override = param_patches.get(param.name)
+                if param_override:
+                    logger.debug("Overriding param: {}:{}".format(slot.name, param_override))
+                    param.patch(param_override)
+        return True
+
+
+_loaded: typing.Dict[typing.Tuple[str, int, int], Overrides] = {}
+_loaded_lock = threading.Lock()
+
+
+def load_overrides(path: str = OVERRIDE_PATH) -> Overrides:
+    """
+    The compiled overrides for `path`.  Compiling means parsing jsonc with
+    json5, which is slow, so the result is kept in memory and in the page
+    store, keyed by the file's mtime and size; compiling again drops what
+    the store held for older versions of the file.
+    """
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _loaded_lock:
+        overrides = _loaded.get(key)
+        if overrides is not None:
+            return overrides
+        memo_prefix = f"overrides:{path}:"
+        memo_key = f"{memo_prefix}{COMPILED_VERSION}:{stat.st_mtime_ns}:{stat.st_size}"
+        cached = get_store().get_memo(memo_key)
+        if cached is not None:
+            memo = json.loads(cached)
+        else:
+            import json5
+
+            logger.debug(f"Compiling overrides from {path}")
+            with open(path, "r") as f:
+                text = f.read()
+            memo = {"digest": content_hash(text), "compiled": compile_overrides(json5.loads(text))}
+            get_store().delete_memos(memo_prefix)
+            get_store().put_memo(memo_key, json.dumps(memo))
+        overrides = _loaded[key] = Overrides(memo["compiled"], memo["digest"])
+        return overrides
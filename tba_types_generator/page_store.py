@@ -0,0 +1,284 @@
+import atexit
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import typing
+import zlib
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "./doc-parser-cache.sqlite"
+# Directory used by older versions, one plain file per page.  Read-only now.
+LEGACY_CACHE_DIR = "./doc-parser-cache"
+MMAP_SIZE = 256 * 1024 * 1024
+# Page reads whose access time is kept in memory before being written out.
+ACCESS_FLUSH_SIZE = 256
+
+# Page bodies are stored once per distinct content (most class pages are
+# identical between Harmony/SBPro versions); urls only point at a hash.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access);
+CREATE INDEX IF NOT EXISTS pages_hash ON pages (hash);
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS memos (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL
+);
+"""
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class PageEntry(typing.NamedTuple):
+    body: str
+    status: int
+    etag: typing.Optional[str]
+    last_modified: typing.Optional[str]
+    fetched_at: float
+
+
+class PageStore:
+    """
+    Single-file store for fetched pages, keyed by full url.
+    Bodies are zlib-compressed and deduplicated by content hash; the least
+    recently used pages are evicted once the compressed total goes over
+    max_bytes (0 means unlimited).
+
+    Reads don't write: access times are only tracked with eviction on, and
+    are batched (see _flush_accesses) so that processes sharing the store
+    don't queue for the write lock on every cache hit.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # url -> last read, not yet written to pages.last_access.
+        self._accesses: typing.Dict[str, float] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def get(self, url: str) -> typing.Optional[PageEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT blobs.body, status, etag, last_modified, fetched_at"
+                " FROM pages JOIN blobs ON pages.hash = blobs.hash WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            if self.max_bytes:
+                self._accesses[url] = time.time()
+                if len(self._accesses) >= ACCESS_FLUSH_SIZE:
+                    with self._conn:
+                        self._flush_accesses()
+        body, status, etag, last_modified, fetched_at = row
+        return PageEntry(zlib.decompress(body).decode(), status, etag, last_modified, fetched_at)
+
+    def get_fetched_at(self, url: str) -> typing.Optional[float]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_digest(self, url: str) -> typing.Optional[typing.Tuple[str, int, float]]:
+        """
+        (content hash, status, fetched_at) of a cached page, without reading
+        the body.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT hash, status, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def put(
+        self,
+        url: str,
+        body: str,
+        status: int = 200,
+        etag: typing.Optional[str] = None,
+        last_modified: typing.Optional[str] = None,
+        fetched_at: typing.Optional[float] = None,
+    ):
+        digest = content_hash(body)
+        now = time.time()
+        with self._lock, self._conn:
+            exists = self._conn.execute(
+                "SELECT 1 FROM blobs WHERE hash = ?", (digest,)
+            ).fetchone()
+            if not exists:
+                blob = zlib.compress(body.encode())
+                # Another process sharing the store may have added it since.
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO blobs (hash, body, size) VALUES (?, ?, ?)",
+                    (digest, blob, len(blob)),
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages"
+                " (url, hash, status, etag, last_modified, fetched_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, digest, status, etag, last_modified, fetched_at or now, now),
+            )
+            if self.max_bytes:
+                self._flush_accesses()
+                self._evict()
+
+    def iter_pages(self) -> typing.Iterator[typing.Tuple[str, str]]:
+        """
+        Every cached page once per distinct body, as (url, html), e.g. for
+        re-running parsers over the whole corpus.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT MIN(url), blobs.body FROM pages JOIN blobs ON pages.hash = blobs.hash"
+                " WHERE status = 200 GROUP BY pages.hash ORDER BY MIN(url)"
+            ).fetchall()
+        for url, body in rows:
+            yield url, zlib.decompress(body).decode()
+
+    def touch(self, url: str):
+        """
+        Mark a cached page as freshly validated (e.g. after a 304).
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE pages SET fetched_at = ?, last_access = ? WHERE url = ?", (now, now, url)
+            )
+
+    def get_memo(self, key: str) -> typing.Optional[str]:
+        """
+        Derived data (parse results etc.) stored alongside the pages.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM memos WHERE key = ?", (key,)
+            ).fetchone()
+        return zlib.decompress(row[0]).decode() if row else None
+
+    def put_memo(self, key: str, value: str):
+        blob = zlib.compress(value.encode())
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO memos (key, value) VALUES (?, ?)", (key, blob)
+            )
+
+    def delete_memos(self, prefix: str, keep: str = ""):
+        """
+        Delete the memos whose key starts with `prefix`, except those whose
+        key starts with `keep` (if given).
+        """
+        with self._lock, self._conn:
+            if keep:
+                self._conn.execute(
+                    "DELETE FROM memos WHERE substr(key, 1, ?) = ? AND substr(key, 1, ?) != ?",
+                    (len(prefix), prefix, len(keep), keep),
+                )
+            else:
+                self._conn.execute(
+                    "DELETE FROM memos WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+                )
+
+    def _flush_accesses(self):
+        # Called with the lock held, inside a transaction.
+        if self._accesses:
+            self._conn.executemany(
+                "UPDATE pages SET last_access = ? WHERE url = ?",
+                [(t, url) for url, t in self._accesses.items()],
+            )
+            self._accesses.clear()
+
+    def _evict(self):
+        # Called with the lock held, inside a transaction.
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for url, digest in self._conn.execute(
+            "SELECT url, hash FROM pages ORDER BY last_access"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            evicted += 1
+            # A blob is only freed once no other url shares it.
+            if not self._conn.execute(
+                "SELECT 1 FROM pages WHERE hash = ?", (digest,)
+            ).fetchone():
+                (size,) = self._conn.execute(
+                    "SELECT size FROM blobs WHERE hash = ?", (digest,)
+                ).fetchone()
+                self._conn.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+                total -= size
+        logger.debug(f"Evicted {evicted} pages from {self.path}")
+
+    def flush(self):
+        """
+        Write out the access times of the pages read since the last write.
+        """
+        with self._lock, self._conn:
+            self._flush_accesses()
+
+    def close(self):
+        atexit.unregister(self.flush)
+        with self._lock:
+            with self._conn:
+                self._flush_accesses()
+            self._conn.close()
+
+
+def read_legacy_page(url: str) -> typing.Optional[typing.Tuple[str, float]]:
+    """
+    Look a page up in the old one-file-per-page cache directory, if present.
+    Returns the page and its modification time.
+    """
+    if not os.path.isdir(LEGACY_CACHE_DIR):
+        return None
+    cache_name = "_".join(url.split("/")[-5:])
+    for filename in (f"{cache_name}.html", cache_name):
+        filepath = os.path.join(LEGACY_CACHE_DIR, filename)
+        if os.path.isfile(filepath):
+            with open(filepath, "r") as f:
+                return f.read(), os.path.getmtime(filepath)
+    return None
+
+
+_store: typing.Optional[PageStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> PageStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            path = os.path.realpath(os.environ.get("TBA_TYPES_CACHE_PATH", DEFAULT_CACHE_PATH))
+            max_bytes = int(os.environ.get("TBA_TYPES_CACHE_MAX_MB", 0)) * 1024 * 1024
+            logger.debug(f"Opening page store: {path}")
+            _store = PageStore(path, max_bytes=max_bytes)
+            if max_bytes:
+                atexit.register(_store.flush)
+        return _store
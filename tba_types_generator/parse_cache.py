@@ -0,0 +1,139 @@
+import functools
+import hashlib
+import importlib
+import itertools
+import json
+import logging
+import typing
+from pathlib import Path
+
+from .page_store import content_hash, get_store
+
+logger = logging.getLogger(__name__)
+
+# Source files whose code decides what a parser returns.  Any edit to them
+# changes the parser version and so invalidates every stored result.
+PARSER_SOURCE_GLOBS = [
+    "parse_cache.py",
+    "parser/*.py",
+    "type_expr.py",
+]
+
+# (parser name, parser version, page hash) -> serialized result.  Results are
+# kept as JSON so every caller gets its own copy to mutate (parent, url,
+# overrides, ...).
+_results: typing.Dict[typing.Tuple[str, str, str], str] = {}
+
+
+@functools.cache
+def _source_version() -> str:
+    import bs4
+
+    h = hashlib.sha256(bs4.__version__.encode())
+    package_dir = Path(__file__).parent
+    for pattern in PARSER_SOURCE_GLOBS:
+        for path in sorted(package_dir.glob(pattern)):
+            h.update(path.read_bytes())
+    return h.hexdigest()[:16]
+
+
+def get_parser_version() -> str:
+    from .parser.soup import get_backend, get_engine
+
+    return f"{_source_version()}-{get_backend()}-{get_engine()}"
+
+
+@functools.cache
+def _prune_stale_results(version: str):
+    """
+    Delete the results stored by other parser versions, once per version
+    and process: nothing reads them again, and they are not counted by the
+    page store's size limit.
+    """
+    get_store().delete_memos("parse:", keep=f"parse:{version}:")
+
+
+def _memo_get(name: str, digest: str) -> typing.Optional[str]:
+    version = get_parser_version()
+    cached = _results.get((name, version, digest))
+    if cached is not None:
+        logger.debug(f"Reusing parse result for {name}")
+        return cached
+    _prune_stale_results(version)
+    cached = get_store().get_memo(f"parse:{version}:{name}:{digest}")
+    if cached is not None:
+        _results[(name, version, digest)] = cached
+    return cached
+
+
+def _memo_put(name: str, digest: str, serialized: str):
+    version = get_parser_version()
+    _results[(name, version, digest)] = serialized
+    _prune_stale_results(version)
+    get_store().put_memo(f"parse:{version}:{name}:{digest}", serialized)
+
+
+def memoize_parse(func):
+    """
+    Reuse the result of a page parser whenever it sees identical html again,
+    e.g. the same class page served by several Harmony/SBPro versions, or
+    the same page on a later run (results are also stored on disk).
+    """
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(html: str):
+        digest = content_hash(html)
+        cached = _memo_get(name, digest)
+        if cached is None:
+            cached = json.dumps(func(html))
+            _memo_put(name, digest, cached)
+        return json.loads(cached)
+
+    wrapper.memo_name = name
+    return wrapper
+
+
+def _parse_in_worker(module_name: str, qualname: str, html: str) -> str:
+    func = getattr(importlib.import_module(module_name), qualname).__wrapped__
+    return json.dumps(func(html))
+
+
+def parse_many(func, htmls: typing.Sequence[str], max_workers: int) -> typing.List[dict]:
+    """
+    Run a memoize_parse'd parser over many pages and return the results in
+    the same order.  Cache misses are parsed in a pool of worker processes;
+    identical pages are only parsed once.
+    """
+    digests = [content_hash(html) for html in htmls]
+    serialized: typing.Dict[str, str] = {}
+    misses: typing.Dict[str, str] = {}
+    for digest, html in zip(digests, htmls):
+        if digest in serialized or digest in misses:
+            continue
+        cached = _memo_get(func.memo_name, digest)
+        if cached is None:
+            misses[digest] = html
+        else:
+            serialized[digest] = cached
+
+    if misses:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        logger.debug(f"Parsing {len(misses)} pages with {max_workers} processes")
+        with ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            results = executor.map(
+                _parse_in_worker,
+                itertools.repeat(func.__module__),
+                itertools.repeat(func.__qualname__),
+                misses.values(),
+                chunksize=max(1, len(misses) // (max_workers * 4)),
+            )
+            for digest, result in zip(misses, results):
+                _memo_put(func.memo_name, digest, result)
+                serialized[digest] = result
+
+    return [json.loads(serialized[digest]) for digest in digests]
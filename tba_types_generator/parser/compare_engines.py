@@ -0,0 +1,129 @@
+"""
+Check the streaming engine against the BeautifulSoup one (with html.parser,
+the tokenizer the streaming engine is built on) on every doxygen class page
+in the page store, then compare their throughput:
+
+    python -m tba_types_generator.parser.compare_engines [--repeat N]
+
+Exits non-zero if any page parses differently.
+"""
+
+import argparse
+import contextlib
+import os
+import time
+import typing
+
+from tba_types_generator.page_store import get_store
+from tba_types_generator.parser.tba_parser import _parse_class_page_bs4
+from tba_types_generator.parser.tba_stream_parser import parse_class_page
+
+ENGINES = {
+    "bs4": _parse_class_page_bs4,
+    "stream": parse_class_page,
+}
+REFERENCE_BACKEND = "html.parser"
+
+
+@contextlib.contextmanager
+def reference_backend():
+    """
+    Run the bs4 engine with REFERENCE_BACKEND, whatever is configured.
+    """
+    previous = os.environ.get("TBA_TYPES_HTML_PARSER")
+    os.environ["TBA_TYPES_HTML_PARSER"] = REFERENCE_BACKEND
+    try:
+        yield
+    finally:
+        if previous is None:
+            del os.environ["TBA_TYPES_HTML_PARSER"]
+        else:
+            os.environ["TBA_TYPES_HTML_PARSER"] = previous
+
+
+def is_class_page(html: str) -> bool:
+    return '<div class="title">' in html and '<div class="contents">' in html
+
+
+def _outcome(parse, html: str):
+    try:
+        return parse(html)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def first_difference(a, b, path: str = "") -> typing.Optional[str]:
+    if type(a) is not type(b):
+        return f"{path or '/'}: {a!r} != {b!r}"
+    if isinstance(a, dict):
+        for key in list(a) + [k for k in b if k not in a]:
+            if key not in a or key not in b:
+                return f"{path}/{key}: only in {'bs4' if key in a else 'stream'}"
+            if diff := first_difference(a[key], b[key], f"{path}/{key}"):
+                return diff
+        return None
+    if isinstance(a, list):
+        for i, (x, y) in enumerate(zip(a, b)):
+            if diff := first_difference(x, y, f"{path}/{i}"):
+                return diff
+        if len(a) != len(b):
+            return f"{path}: {len(a)} items != {len(b)} items"
+        return None
+    if a != b:
+        return f"{path or '/'}: {a!r} != {b!r}"
+    return None
+
+
+def check_conformance(pages: typing.Sequence[typing.Tuple[str, str]]):
+    """
+    Returns (url, first difference) for every page the engines disagree on.
+    """
+    mismatches = []
+    with reference_backend():
+        for url, html in pages:
+            expected = _outcome(ENGINES["bs4"], html)
+            actual = _outcome(ENGINES["stream"], html)
+            if diff := first_difference(expected, actual):
+                mismatches.append((url, diff))
+    return mismatches
+
+
+def measure(parse, pages: typing.Sequence[typing.Tuple[str, str]], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _, html in pages:
+            _outcome(parse, html)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--repeat", type=int, default=3, help="Timing runs per engine")
+    args = parser.parse_args(argv)
+
+    pages = [(url, html) for url, html in get_store().iter_pages() if is_class_page(html)]
+    if not pages:
+        print("No doxygen class pages in the page store; run generate.py first")
+        return 1
+    size_mb = sum(len(html) for _, html in pages) / 1024 / 1024
+    print(f"{len(pages)} class pages ({size_mb:.1f} MB), bs4 backend: {REFERENCE_BACKEND}")
+
+    mismatches = check_conformance(pages)
+    for url, diff in mismatches:
+        print(f"MISMATCH {url}\n    {diff}")
+    print(f"{len(pages) - len(mismatches)}/{len(pages)} pages parse identically")
+
+    for name, parse in ENGINES.items():
+        with reference_backend():
+            seconds = measure(parse, pages, args.repeat)
+        print(
+            f"{name:>6}: {seconds:.3f}s, {len(pages) / seconds:.0f} pages/s,"
+            f" {size_mb / seconds:.1f} MB/s"
+        )
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
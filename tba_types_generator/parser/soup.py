@@ -0,0 +1,60 @@
+import contextlib
+import os
+import typing
+
+# BeautifulSoup backends; html.parser is the default, so output and parse
+# cache keys don't depend on what happens to be installed.  lxml (the
+# "fast" extra) is opt-in.
+HTML_BACKENDS = ("html.parser", "lxml")
+# Doxygen class page engines: BeautifulSoup (default), or the tree-free
+# tba_stream_parser.
+PARSE_ENGINES = ("bs4", "stream")
+
+
+def get_backend() -> str:
+    backend = os.environ.get("TBA_TYPES_HTML_PARSER") or HTML_BACKENDS[0]
+    if backend not in HTML_BACKENDS:
+        raise ValueError(f"Unknown HTML parser {backend!r}, expected one of {HTML_BACKENDS}")
+    return backend
+
+
+def get_engine() -> str:
+    engine = os.environ.get("TBA_TYPES_PARSE_ENGINE", PARSE_ENGINES[0])
+    if engine not in PARSE_ENGINES:
+        raise ValueError(f"Unknown parse engine {engine!r}, expected one of {PARSE_ENGINES}")
+    return engine
+
+
+class LazyStrainer:
+    """
+    SoupStrainer arguments that can live in a module constant without
+    importing bs4 until a page is actually parsed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._args = args
+        self._kwargs = kwargs
+        self._strainer = None
+
+    def get(self):
+        if self._strainer is None:
+            from bs4 import SoupStrainer
+
+            self._strainer = SoupStrainer(*self._args, **self._kwargs)
+        return self._strainer
+
+
+@contextlib.contextmanager
+def parse_html(html: str, parse_only: typing.Optional[LazyStrainer] = None):
+    """
+    Build a soup with the selected backend, optionally restricted to the
+    regions a parser actually reads, and tear the tree down afterwards.
+    Callers must not keep references to tags past the with block.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, get_backend(), parse_only=parse_only.get() if parse_only else None)
+    try:
+        yield soup
+    finally:
+        soup.decompose()
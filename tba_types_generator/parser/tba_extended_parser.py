@@ -1,9 +1,17 @@
+from __future__ import annotations
+
 import logging
 import re
+import typing
+from concurrent.futures import ThreadPoolExecutor
 
-from bs4 import BeautifulSoup
+from tba_types_generator.parse_cache import memoize_parse
+from tba_types_generator.parser.soup import LazyStrainer, parse_html
+from tba_types_generator.type_expr import jsdoc_to_ts
+from tba_types_generator.url_getter import MAX_WORKERS, bind_context, get_url
 
-from tba_types_generator.url_getter import get_url
+if typing.TYPE_CHECKING:
+    import bs4
 
 logger = logging.getLogger(__name__)
 HARMONY_DOC_PAT = (
@@ -12,21 +20,54 @@ HARMONY_DOC_PAT = (
 HARMONY_DOC_PAT_GLOBALS = (
     "https://docs.toonboom.com/help/harmony-{0}/scripting/extended/global.html"
 )
+INDEX_STRAINER = LazyStrainer("nav")
+CLASS_PAGE_STRAINER = LazyStrainer(["h1", "article"])
+GLOBALS_STRAINER = LazyStrainer("article")
+
+
+class ClassFailure(typing.NamedTuple):
+    name: str
+    url: str
+    error: str
+
 
+def _load_class(class_url: str):
+    class_html = get_url(class_url)
+    if not class_html:
+        raise LookupError(f"No page at {class_url}")
+    return _parse_class(class_html)
 
-def get_classes(version_num: int):
+
+def get_classes(
+    version_num: int,
+    failures: typing.Optional[typing.List[ClassFailure]] = None,
+    max_workers: int = MAX_WORKERS,
+):
+    """
+    Yield the classes listed in the index, in index order.  Class pages are
+    fetched and parsed by a bounded pool of threads; a class that fails is
+    logged, added to `failures` (if given) and skipped.
+    """
     url = HARMONY_DOC_PAT.format(version_num)
     base_url = "/".join(url.split("/")[:-1])
     html = get_url(url)
     assert html
     classes = _parse_index(html)
-    for class_data in classes:
-        class_url = f"{base_url}/{class_data['url']}"
-        class_html = get_url(class_url)
-        assert class_html
-        class_data.update(_parse_class(class_html))
-        class_data["url"] = class_url
-        yield class_data
+    class_urls = [f"{base_url}/{class_data['url']}" for class_data in classes]
+    load_class = bind_context(_load_class)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(load_class, class_url) for class_url in class_urls]
+        for class_data, class_url, future in zip(classes, class_urls, futures):
+            try:
+                parsed = future.result()
+            except Exception as e:
+                logger.error(f"Skipping {class_data['name']} ({class_url}): {e!r}")
+                if failures is not None:
+                    failures.append(ClassFailure(class_data["name"], class_url, repr(e)))
+                continue
+            class_data.update(parsed)
+            class_data["url"] = class_url
+            yield class_data
 
 
 def get_globals(version_num: int):
@@ -37,30 +78,30 @@ def get_globals(version_num: int):
     return harmony_globals
 
 
+@memoize_parse
 def _parse_index(html: str):
-    soup = BeautifulSoup(html, "html.parser")
-
-    nav = soup.find("nav")
-    assert nav
-
-    classes = []
-    for h3 in nav.find_all("h3"):
-        category = h3.text
-        if category not in ("Classes", "Modules"):
-            continue
-        ul = h3.find_next_sibling("ul")
-        assert ul
-        for li in ul.find_all("li", recursive=False):
-            a = li.find("a")
-            assert a
-            class_name = a.text.strip()
-            class_url = a["href"]
-            class_data = dict(name=class_name, url=class_url)
-            class_data["is_namespace"] = category == "Modules"
-            classes.append(class_data)
-            logger.debug(f"{class_name}: {class_url}")
-        # methods_ul = li.find('ul', {'class': 'slots'})
-    return classes
+    with parse_html(html, parse_only=INDEX_STRAINER) as soup:
+        nav = soup.find("nav")
+        assert nav
+
+        classes = []
+        for h3 in nav.find_all("h3"):
+            category = h3.text
+            if category not in ("Classes", "Modules"):
+                continue
+            ul = h3.find_next_sibling("ul")
+            assert ul
+            for li in ul.find_all("li", recursive=False):
+                a = li.find("a")
+                assert a
+                class_name = a.text.strip()
+                class_url = a["href"]
+                class_data = dict(name=class_name, url=class_url)
+                class_data["is_namespace"] = category == "Modules"
+                classes.append(class_data)
+                logger.debug(f"{class_name}: {class_url}")
+            # methods_ul = li.find('ul', {'class': 'slots'})
+        return classes
 
 
 def _parse_keyword(txt: str):
@@ -78,24 +119,7 @@ def _parse_method_name(txt: str):
 
 
 def _parse_type(txt: str):
-    if txt == "Array":
-        return "any[]"
-    if txt == "function":
-        return "(...args: any[]) => any"
-    # assert not "boolean" in txt
-    # FIXME: Too lazy to write a proper parser; just check for 2d array
-    match = re.search(r"Array\.\<Array\.\<(.+?)\>\>", txt)
-    if match:
-        return f"{match.group(1)}[][]"
-    match = re.search(r"Array\.\<(.+?)\>", txt)
-    if match:
-        return f"{match.group(1)}[]"
-    match = re.search(r"Object\.\<(.+?), (.+?)>", txt)
-    if match:
-        return f"{{[key: {match.group(1)}] : {match.group(2)}}}"
-    if txt == "boolean\n|\n\nfunction":
-        return "boolean | ((...args: any[]) => boolean)"
-    return txt
+    return jsdoc_to_ts(txt)
 
 
 def _parse_schema_table(tbody):
@@ -120,135 +144,191 @@ def _parse_schema_table(tbody):
     return fields
 
 
-def _parse_class(html: str):
-    class_data = {"slots": [], "example": "", "desc": ""}
-    soup = BeautifulSoup(html, "html.parser")
-    title_h1 = soup.find("h1", {"class": "page-title"})
-    assert title_h1
-    class_name = title_h1.text.strip()
-    if "/" in class_name:
-        class_data["namespace"], class_data["name"] = tuple(class_name.split("/"))
-    else:
-        class_data["name"] = class_name
-    article = soup.find("article")
-    assert article
-    container_overview = article.find(
-        "div", {"class": "container-overview"}, recursive=False
-    )
-    assert container_overview
-    class_desc_div = container_overview.find("div", {"class": "description"})
-    assert class_desc_div
-    class_data["desc"] = class_desc_div.text
-
-    for h4 in article.find_all("h4", {"class": "name"}):
-        h4["id"]
-        method_desc = ""
-        # method_name = h4.text
-        method_keyword, method_name, _, _ = tuple((h.text.strip() for h in h4.contents))
-        method_keyword = _parse_keyword(method_keyword)
-        method_name = _parse_method_name(method_name)
-        logger.debug(f"Keyword: {method_keyword}, Name: {method_name}")
-        method_desc_div = h4.find_next_sibling("div", {"class": "description"})
-        if method_desc_div:
-            method_desc = method_desc_div.text.strip()
-        logger.debug(f"Method: {method_name}\n\t{method_desc}")
-
-        method_dict = {
-            "name": method_name,
-            "keyword": method_keyword,
-            "desc": method_desc,
-            "params": [],
-            "type": "",
+class _Siblings:
+    """
+    The element children of one parent, with "next sibling matching X"
+    precomputed in one backward pass, so sections can be read in a single
+    walk instead of a find_next_sibling scan per lookup.
+    """
+
+    def __init__(self, parent: bs4.element.Tag, kinds: typing.Dict[str, typing.Tuple]):
+        self.tags = [child for child in parent.children if child.name]
+        self.index = {id(tag): i for i, tag in enumerate(self.tags)}
+        self._next: typing.Dict[str, typing.List[typing.Optional[int]]] = {}
+        for kind, (name, class_name) in kinds.items():
+            following = [None] * (len(self.tags) + 1)
+            for i in range(len(self.tags) - 1, -1, -1):
+                tag = self.tags[i]
+                if tag.name == name and (class_name is None or class_name in tag.get("class", ())):
+                    following[i] = i
+                else:
+                    following[i] = following[i + 1]
+            self._next[kind] = following
+
+    def next(self, kind: str, i: int) -> typing.Optional[int]:
+        """
+        Index of the first sibling of this kind after index i.
+        """
+        return self._next[kind][i + 1]
+
+    def get(self, i: typing.Optional[int]) -> typing.Optional[bs4.element.Tag]:
+        return None if i is None else self.tags[i]
+
+
+CLASS_SIBLING_KINDS = {
+    "description": ("div", "description"),
+    "p": ("p", None),
+    "pre": ("pre", None),
+    "params": ("table", "params"),
+    "returns": ("dl", "param-type"),
+}
+
+
+def _iter_with_siblings(tags, kinds):
+    # h4s usually share one parent; index each parent once.
+    indexed: typing.Dict[int, _Siblings] = {}
+    for tag in tags:
+        parent = tag.parent
+        siblings = indexed.get(id(parent))
+        if siblings is None:
+            siblings = indexed[id(parent)] = _Siblings(parent, kinds)
+        yield tag, siblings, siblings.index[id(tag)]
+
+
+def _parse_params_table(parameters_table: bs4.element.Tag) -> typing.List[typing.Dict]:
+    params = []
+    parameters_table_body = parameters_table.find("tbody", recursive=False)
+    assert parameters_table_body
+    for tr in parameters_table_body.find_all("tr", recursive=False):
+        name_td = tr.find("td", {"class": "name"}, recursive=False)
+        type_td = tr.find("td", {"class": "type"}, recursive=False)
+        attr_td = tr.find("td", {"class": "attributes"}, recursive=False)
+        if attr_td:
+            logger.debug(f"Atr: {attr_td}")
+        description_td = tr.find("td", {"class": "description"}, recursive=False)
+        assert name_td
+        assert type_td
+        assert description_td
+        param_name = name_td.text.strip()
+        param_type = _parse_type(type_td.text.strip())
+        param_desc = description_td.contents[0].text.strip()
+        param_dict = {
+            "name": param_name,
+            "type": param_type,
+            "desc": param_desc,
         }
-        class_data["slots"].append(method_dict)
+        params.append(param_dict)
+        logger.debug(f"Parameter: {param_name} {param_type} {param_desc}")
+        param_object_schema_tbody = description_td.find("tbody")
+        if param_object_schema_tbody:
+            param_dict["object_schema"] = _parse_schema_table(param_object_schema_tbody)
+    return params
 
-        for sibling in h4.next_siblings:
-            if sibling.name == "h4":  # pyright: ignore[reportAttributeAccessIssue]
-                break
 
-            if sibling.name == "h5":  # pyright: ignore[reportAttributeAccessIssue]
+@memoize_parse
+def _parse_class(html: str):
+    class_data = {"slots": [], "example": "", "desc": ""}
+    with parse_html(html, parse_only=CLASS_PAGE_STRAINER) as soup:
+        title_h1 = soup.find("h1", {"class": "page-title"})
+        assert title_h1
+        class_name = title_h1.text.strip()
+        if "/" in class_name:
+            class_data["namespace"], class_data["name"] = tuple(class_name.split("/"))
+        else:
+            class_data["name"] = class_name
+        article = soup.find("article")
+        assert article
+        container_overview = article.find(
+            "div", {"class": "container-overview"}, recursive=False
+        )
+        assert container_overview
+        class_desc_div = container_overview.find("div", {"class": "description"})
+        assert class_desc_div
+        class_data["desc"] = class_desc_div.text
+
+        h4s = article.find_all("h4", {"class": "name"})
+        for h4, siblings, i in _iter_with_siblings(h4s, CLASS_SIBLING_KINDS):
+            h4["id"]
+            method_desc = ""
+            # method_name = h4.text
+            method_keyword, method_name, _, _ = tuple((h.text.strip() for h in h4.contents))
+            method_keyword = _parse_keyword(method_keyword)
+            method_name = _parse_method_name(method_name)
+            logger.debug(f"Keyword: {method_keyword}, Name: {method_name}")
+            # Like find_next_sibling, these lookups may reach past the next h4.
+            method_desc_div = siblings.get(siblings.next("description", i))
+            if method_desc_div:
+                method_desc = method_desc_div.text.strip()
+            logger.debug(f"Method: {method_name}\n\t{method_desc}")
+
+            method_dict = {
+                "name": method_name,
+                "keyword": method_keyword,
+                "desc": method_desc,
+                "params": [],
+                "type": "",
+            }
+            class_data["slots"].append(method_dict)
+
+            # The method's section runs up to the next h4.
+            for j in range(i + 1, len(siblings.tags)):
+                sibling = siblings.tags[j]
+                if sibling.name == "h4":
+                    break
+                if sibling.name != "h5":
+                    continue
                 if "Example" in sibling.text:
-                    example_p = sibling.find_next_sibling("p")
-                    if example_p:
+                    example_p_index = siblings.next("p", j)
+                    if example_p_index is not None:
                         # example_desc = example_p.text
-                        example_code_pre = example_p.find_next_sibling("pre")
+                        example_code_pre = siblings.get(siblings.next("pre", example_p_index))
                         assert example_code_pre
                         method_dict["example"] = example_code_pre.find("code").text  # pyright: ignore[reportOptionalMemberAccess]
                 elif "Parameters" in sibling.text:
-                    parameters_table = sibling.find_next_sibling(
-                        "table", {"class": "params"}
-                    )
+                    parameters_table = siblings.get(siblings.next("params", j))
                     assert parameters_table
-                    parameters_table_body = parameters_table.find(
-                        "tbody", recursive=False
-                    )
-                    assert parameters_table_body
-                    for tr in parameters_table_body.find_all("tr", recursive=False):
-                        # tmp = list(tr.find_all('td'))
-                        name_td = tr.find("td", {"class": "name"}, recursive=False)
-                        type_td = tr.find("td", {"class": "type"}, recursive=False)
-                        attr_td = tr.find(
-                            "td", {"class": "attributes"}, recursive=False
-                        )
-                        if attr_td:
-                            logger.debug(f"Atr: {attr_td}")
-                        description_td = tr.find(
-                            "td", {"class": "description"}, recursive=False
-                        )
-                        assert name_td
-                        assert type_td
-                        assert description_td
-                        param_name = name_td.text.strip()
-                        param_type = _parse_type(type_td.text.strip())
-                        param_desc = description_td.contents[0].text.strip()
-                        param_dict = {
-                            "name": param_name,
-                            "type": param_type,
-                            "desc": param_desc,
-                        }
-                        method_dict["params"].append(param_dict)
-                        logger.debug(
-                            f"Parameter: {param_name} {param_type} {param_desc}"
-                        )
-                        param_object_schema_tbody = description_td.find("tbody")
-                        if param_object_schema_tbody:
-                            param_dict["object_schema"] = _parse_schema_table(
-                                param_object_schema_tbody
-                            )
+                    method_dict["params"].extend(_parse_params_table(parameters_table))
                 elif "Returns" in sibling.text:
-                    dl = sibling.find_next_sibling("dl", {"class": "param-type"})
+                    dl = siblings.get(siblings.next("returns", j))
                     if dl:
                         return_type_span = dl.find("span", {"class": "param-type"})
                         assert return_type_span
                         method_dict["type"] = _parse_type(return_type_span.text.strip())
-                        assert "Array" not in method_dict["type"]
-                        assert "Object<" not in method_dict["type"]
-    return class_data
+        return class_data
 
 
+GLOBALS_SIBLING_KINDS = {
+    "table": ("table", None),
+    "description": ("div", "description"),
+}
+
+
+@memoize_parse
 def _parse_globals(html: str):
     """
     Only deals with interfaces
     """
-    soup = BeautifulSoup(html, "html.parser")
-    harmony_globals = []
-    article = soup.find("article")
-    assert article
-    for h4 in article.find_all("h4", {"class": "name"}):
-        global_name = h4.text.strip()
-        props_table = h4.find_next_sibling("table")
-        assert props_table
-        tbody = props_table.find("tbody")
-        schema = _parse_schema_table(tbody)
-
-        desc_div = props_table.find_next_sibling("div", {"class": "description"})
-        assert desc_div
-        harmony_globals.append(
-            {
-                "name": global_name,
-                "object_schema": schema,
-                "desc": desc_div.text.strip(),
-            }
-        )
-
-    return harmony_globals
+    with parse_html(html, parse_only=GLOBALS_STRAINER) as soup:
+        harmony_globals = []
+        article = soup.find("article")
+        assert article
+        h4s = article.find_all("h4", {"class": "name"})
+        for h4, siblings, i in _iter_with_siblings(h4s, GLOBALS_SIBLING_KINDS):
+            global_name = h4.text.strip()
+            table_index = siblings.next("table", i)
+            assert table_index is not None
+            props_table = siblings.tags[table_index]
+            tbody = props_table.find("tbody")
+            schema = _parse_schema_table(tbody)
+
+            desc_div = siblings.get(siblings.next("description", table_index))
+            assert desc_div
+            harmony_globals.append(
+                {
+                    "name": global_name,
+                    "object_schema": schema,
+                    "desc": desc_div.text.strip(),
+                }
+            )
+
+        return harmony_globals
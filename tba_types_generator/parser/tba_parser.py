@@ -1,14 +1,20 @@
+from __future__ import annotations
+
+import json
 import logging
+import os
 import re
 import typing
 from typing import Dict, Optional, Tuple
 
-import bs4
-import esprima
-import jsbeautifier
-from bs4 import BeautifulSoup
+from tba_types_generator.parse_cache import memoize_parse, parse_many
+from tba_types_generator.parser.soup import LazyStrainer, get_engine, parse_html
+from tba_types_generator.type_expr import split_function_name
+from tba_types_generator.url_getter import get_url, prefetch_urls
 
-from tba_types_generator.url_getter import get_url
+if typing.TYPE_CHECKING:
+    import bs4
+    from bs4 import BeautifulSoup
 
 logger = logging.getLogger(__name__)
 
@@ -40,39 +46,53 @@ def _group_from_labels(labels):
     raise ValueError(labels)
 
 
-def parse_class_page_detailed(html: str) -> Dict:
-    soup = BeautifulSoup(html, "html.parser")
-
-    class_data = {
-        "name": _find_class_name(soup),
-        "is_namespace": _is_namespace(soup),
-        "slots": [],
-        "props": [],
-        "enums": [],
-    }
-
-    class_data["desc"], class_data["example"] = _find_class_desc(soup)
-
-    contents_div = soup.find("div", {"class": "contents"})
-    assert contents_div
+# Doxygen pages: the title, and div.contents holding the details and memitems.
+CLASS_PAGE_STRAINER = LazyStrainer("div", attrs={"class": ["title", "contents"]})
 
-    groups = {}
 
-    # current_group = None
-    item: bs4.element.Tag
-    for item in contents_div.find_all("div", {"class": "memitem"}, recursive=False):
-        labels = _sniff_div_labels(item)
-        group_name = _group_from_labels(labels)
-        if not group_name:  # Skip invalid items (friends for example)
-            continue
-
-        if group_name not in groups:
-            groups[group_name] = []
-        if group_name == "enum":
-            func_data = _parse_enum_div(item)
-        else:
-            func_data = _parse_function_div(item)
-            groups[group_name].append(func_data)
+@memoize_parse
+def parse_class_page_detailed(html: str) -> Dict:
+    if get_engine() == "stream":
+        from tba_types_generator.parser.tba_stream_parser import parse_class_page
+
+        return parse_class_page(html)
+    return _parse_class_page_bs4(html)
+
+
+def _parse_class_page_bs4(html: str) -> Dict:
+    with parse_html(html, parse_only=CLASS_PAGE_STRAINER) as soup:
+        class_data = {
+            "name": _find_class_name(soup),
+            "is_namespace": _is_namespace(soup),
+            "slots": [],
+            "props": [],
+            "enums": [],
+        }
+
+        class_data["desc"], class_data["example"] = _find_class_desc(soup)
+        if class_data["example"]:
+            class_data["beautify_example"] = True
+
+        contents_div = soup.find("div", {"class": "contents"})
+        assert contents_div
+
+        groups = {}
+
+        # current_group = None
+        item: bs4.element.Tag
+        for item in contents_div.find_all("div", {"class": "memitem"}, recursive=False):
+            labels = _sniff_div_labels(item)
+            group_name = _group_from_labels(labels)
+            if not group_name:  # Skip invalid items (friends for example)
+                continue
+
+            if group_name not in groups:
+                groups[group_name] = []
+            if group_name == "enum":
+                func_data = _parse_enum_div(item)
+            else:
+                func_data = _parse_function_div(item)
+                groups[group_name].append(func_data)
 
     for group_name, members in groups.items():
         if not members:
@@ -86,22 +106,39 @@ def parse_class_page_detailed(html: str) -> Dict:
 
 def get_class_hierarchy(js_url: str):
     js_str = get_url(js_url)
-    data = esprima.parseScript(js_str)
-    js_var = data.body[0].declarations[0]
-    assert js_var.id.name == "hierarchy"
-    tree = _read_elements(js_var.init.elements)
-    return tree
+    return _read_js_array_var(js_str, "hierarchy")
 
 
 def get_namespaces(js_url: str):
     # Note - it seems by 'namespaces' they mean global functions.
     # For this reason we just need a list of links here.
     js_str = get_url(js_url)
+    return _read_js_array_var(js_str, "namespaces_dup")
+
+
+def _read_js_array_var(js_str: str, var_name: str):
+    """
+    Read a doxygen navtree script (`var <name> = [[...], ...];`).
+    The array literal is plain JSON in practice, so it is read with json;
+    anything else falls back to esprima.
+    """
+    declaration, _, value = js_str.partition("=")
+    if declaration.split() == ["var", var_name]:
+        try:
+            return _read_literal_elements(json.loads(value.strip().rstrip(";")))
+        except (ValueError, TypeError, IndexError):
+            pass
+    logger.debug(f"Falling back to esprima for {var_name}")
+    return _read_js_array_var_esprima(js_str, var_name)
+
+
+def _read_js_array_var_esprima(js_str: str, var_name: str):
+    import esprima
+
     data = esprima.parseScript(js_str)
     js_var = data.body[0].declarations[0]
-    assert js_var.id.name == "namespaces_dup"
-    tree = _read_elements(js_var.init.elements)
-    return tree
+    assert js_var.id.name == var_name
+    return _read_elements(js_var.init.elements)
 
 
 def get_harmony_hierarchy_url(version):
@@ -120,49 +157,89 @@ def get_class_name_from_url(url):
     return re.search(r"class(\w+)\.html", url.split("/").pop()).group(1)  # pyright: ignore[reportOptionalMemberAccess]
 
 
-def get_classes(host, version_num):
-    return iter_class_htmls(host, version_num)
+def get_classes(host, version_num, parse_workers=None):
+    return iter_class_htmls(host, version_num, parse_workers=parse_workers)
 
 
-def iter_class_htmls(host, version_num):
+def iter_class_htmls(host, version_num, parse_workers=None):
+    """
+    Yield parsed classes in hierarchy order.  With parse_workers > 1 the
+    pages are parsed in that many worker processes.
+    """
     if host == "harmony":
         hierarchy_url = get_harmony_hierarchy_url(version_num)
         base_url = "/".join(hierarchy_url.split("/")[:-1])
     else:
         hierarchy_url = get_sbpro_hierarchy_url(version_num)
         base_url = "/".join(hierarchy_url.split("/")[:-1])
+    if parse_workers is None:
+        parse_workers = int(os.environ.get("TBA_TYPES_PARSE_WORKERS", 0))
 
     used_names = []  # FIXME: Multiple inheritance???
     logger.debug(f"Loading Class hierarchy from {hierarchy_url}")
 
-    def _iter_leaf(parent_name, items):
-        for item in items:
-            if item.get("url", None):
-                logger.debug(f"Parsing item: {item}")
-                url = "{}/{}".format(base_url, item["url"])
-                html = get_url(url)
-                if not html:
-                    logger.debug("Failed to get: {0}".format(url))
-                    continue
-                data = parse_class_page_detailed(html)
-                if "::" in data["name"]:  # FIXME
-                    continue
-                if data["name"] in used_names:
-                    continue
-                used_names.append(data["name"])
-                data["parent"] = parent_name
-                data["url"] = url
-
-                yield data
-            if "members" in item:
-                yield from _iter_leaf(item["name"], item["members"])
-
-    tree = get_class_hierarchy(hierarchy_url)
-    yield from _iter_leaf(None, tree)
+    trees = [get_class_hierarchy(hierarchy_url)]
     if host == "harmony":
         namespace_url = get_harmony_namespace_url(version_num)
-        tree = get_namespaces(namespace_url)
-        yield from _iter_leaf(None, tree)
+        trees.append(get_namespaces(namespace_url))
+    leaves = []
+    for tree in trees:
+        _collect_tree_leaves(None, tree, None, leaves)
+    urls = ["{}/{}".format(base_url, item["url"]) for _, item, _ in leaves]
+    prefetch_urls(urls)
+    # Indices of the leaves left out.  Like a class that fails to load, a
+    # class left out takes its subclasses with it.
+    skipped = set()
+
+    def _iter_pages():
+        for i, ((_, item, ancestor), url) in enumerate(zip(leaves, urls)):
+            if ancestor in skipped:
+                skipped.add(i)
+                continue
+            logger.debug(f"Parsing item: {item}")
+            html = get_url(url)
+            if not html:
+                logger.debug("Failed to get: {0}".format(url))
+                skipped.add(i)
+                continue
+            yield i, html
+
+    if parse_workers > 1:
+        pages = list(_iter_pages())
+        parsed = parse_many(
+            parse_class_page_detailed, [html for _, html in pages], parse_workers
+        )
+        results = zip(pages, parsed)
+    else:
+        results = ((page, parse_class_page_detailed(page[1])) for page in _iter_pages())
+
+    for (i, _), data in results:
+        parent_name, _, ancestor = leaves[i]
+        # Pages parsed ahead (parse_workers > 1) may belong to a subtree
+        # dropped since.
+        if ancestor in skipped or "::" in data["name"] or data["name"] in used_names:  # FIXME ::
+            skipped.add(i)
+            continue
+        used_names.append(data["name"])
+        data["parent"] = parent_name
+        data["url"] = urls[i]
+
+        yield data
+
+
+def _collect_tree_leaves(parent_name, items, ancestor, leaves):
+    """
+    Walk the hierarchy depth-first, appending (parent name, item, index of
+    the closest ancestor leaf or None) to `leaves` for every item that has
+    a page.
+    """
+    for item in items:
+        index = ancestor
+        if item.get("url", None):
+            index = len(leaves)
+            leaves.append((parent_name, item, ancestor))
+        if "members" in item:
+            _collect_tree_leaves(item["name"], item["members"], index, leaves)
 
 
 DEFAULT_PARAMETER_VALUE_PAT = r"=(.+)"
@@ -180,35 +257,8 @@ def _clean_argument_name(txt):
     return parameter_name, default_value
 
 
-FUNC_KEYWORD_PAT = r"^(?P<keyword>virtual|static) "
-FUNC_NAMESPACED_NAME_PAT = r"(?:[a-z0-9_]+::)?(?P<name>[~a-z0-9_]+)$"
-
-
 def _clean_function_name(txt):
-    txt = txt.replace("Q_INVOKABLE", "")
-    m = re.search(FUNC_KEYWORD_PAT, txt.strip())
-    keyword = None
-    if m:
-        txt = re.sub(FUNC_KEYWORD_PAT, "", txt.strip()).strip()
-        keyword = m.group("keyword")
-    m = re.search(FUNC_NAMESPACED_NAME_PAT, txt.strip(), flags=re.I)
-    assert m
-    # if m:
-    func_name = m.group("name")
-    txt = re.sub(FUNC_NAMESPACED_NAME_PAT, "", txt.strip(), flags=re.I).strip()
-    if not txt:
-        type_name = "void"
-    elif " " in txt:
-        # NOTE: There is a common mistake in the documentation
-        # Where the actual field name is accidentally in the type
-        try:
-            type_name, func_name = tuple(txt.split(" "))
-        except ValueError:
-            logger.error("Failed to parse %s into tuple", txt)
-            type_name = txt
-    else:
-        type_name = txt
-    return type_name, func_name, keyword
+    return split_function_name(txt)
 
 
 def _clean_argument_desc(txt):
@@ -254,11 +304,14 @@ def _parse_signature_table(signature_table: bs4.element.Tag) -> Dict:
 
 
 def _parse_example_div(e):
+    """
+    Returns the raw code; it is beautified at emit time (see examples.py),
+    so the dict holding it should be flagged with "beautify_example".
+    """
     example_lines = []
     for div in e.find_all("div", {"class": "line"}):
         example_lines.append(div.text)
-    example = "\n".join(example_lines)
-    return jsbeautifier.beautify(example)
+    return "\n".join(example_lines)
 
 
 def _parse_memdoc(doc_div: bs4.element.Tag) -> Dict:
@@ -273,6 +326,7 @@ def _parse_memdoc(doc_div: bs4.element.Tag) -> Dict:
 
     if example_div := doc_div.find("div", {"class": "fragment"}):
         func_data["example"] = _parse_example_div(example_div)
+        func_data["beautify_example"] = True
 
     param_docs = []
     if params_table := doc_div.find("table", {"class": "params"}):
@@ -396,6 +450,18 @@ def _parse_type(type_name):
     return type_name.strip()
 
 
+def _read_literal_elements(elements: list):
+    items = []
+    for elem in elements:
+        item = dict(name=elem[0], url=elem[1])
+        members = elem[2]
+        if members:
+            item["members"] = _read_literal_elements(members)
+        items.append(item)
+
+    return items
+
+
 def _read_elements(elements):
     items = []
     for elem in elements:
@@ -0,0 +1,555 @@
+from html.entities import html5
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional
+
+from tba_types_generator.parser.tba_parser import (
+    _clean_argument_desc,
+    _clean_argument_name,
+    _clean_function_name,
+    _group_from_labels,
+    _parse_type,
+)
+
+# Streaming engine for doxygen class pages: a single pass over html.parser
+# events, keeping only the text of the elements tba_parser reads.  It must
+# return exactly what parse_class_page_detailed's BeautifulSoup code does,
+# so the rules below mirror how bs4 builds .text (see compare_engines.py).
+
+# Elements that never get an end tag.
+VOID_ELEMENTS = frozenset(
+    [
+        "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen",
+        "link", "menuitem", "meta", "param", "source", "track", "wbr",
+        "basefont", "bgsound", "command", "frame", "image", "isindex",
+        "nextid", "spacer",
+    ]
+)  # fmt: skip
+# Strings inside these are not part of an element's text.
+NON_TEXT_ELEMENTS = frozenset(["script", "style", "template", "rt", "rp"])
+# Outside of these, a whitespace-only string becomes a single " " or "\n".
+PRESERVE_WHITESPACE_ELEMENTS = frozenset(["pre", "textarea"])
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+# Progress of a "first matching descendant" lookup.
+NOT_SEEN, OPEN, DONE = range(3)
+
+Sink = List[str]
+
+
+def _text(sink: Sink) -> str:
+    return "".join(sink)
+
+
+class _Frame:
+    __slots__ = ("tag", "sinks", "on_close", "row")
+
+    def __init__(self, tag: str):
+        self.tag = tag
+        # Number of text sinks this element added (they sit at the end of
+        # the parser's sink list while it is open).
+        self.sinks = 0
+        self.on_close: Optional[Callable[[], None]] = None
+        # The sink list of a table row whose direct td children are read.
+        self.row: Optional[List[Sink]] = None
+
+
+class _DocBlock:
+    """
+    A div.textblock or div.memdoc: its paragraphs, first code fragment and
+    (for memdocs) first params table.
+    """
+
+    def __init__(self):
+        self.paragraphs: List[Sink] = []
+        self.fragment = NOT_SEEN
+        self.lines: List[Sink] = []
+        self.params = NOT_SEEN
+        self.params_frame: Optional[_Frame] = None
+        self.param_rows: List[_ParamRow] = []
+        self.param_row: Optional[_ParamRow] = None
+
+
+class _ParamRow:
+    __slots__ = ("tds", "schema", "schema_rows")
+
+    def __init__(self):
+        self.tds: List[Sink] = []
+        self.schema = NOT_SEEN
+        self.schema_rows: List[List[Sink]] = []
+
+
+class _SignatureRow:
+    __slots__ = ("memname", "paramtype", "paramname")
+
+    def __init__(self):
+        self.memname: Optional[Sink] = None
+        self.paramtype: Optional[Sink] = None
+        self.paramname: Optional[Sink] = None
+
+
+class _Member:
+    """
+    A div.memitem directly inside div.contents.
+    """
+
+    def __init__(self):
+        self.labels: List[Sink] = []
+        self.memname: Optional[Sink] = None
+        self.signature = NOT_SEEN
+        self.signature_rows: List[_SignatureRow] = []
+        self.open_signature_rows: List[_SignatureRow] = []
+        self.memdoc = NOT_SEEN
+        self.doc = _DocBlock()
+
+
+class _ClassPageParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack: List[_Frame] = []
+        self.sinks: List[Sink] = []
+        self.pending: List[str] = []
+        self.non_text = 0
+        self.preserve_whitespace = 0
+        # div.title / div.contents currently open (the regions bs4 keeps).
+        self.kept = 0
+
+        self.title = NOT_SEEN
+        self.title_text: Sink = []
+        self.title_first: Optional[str] = None
+        self.contents = NOT_SEEN
+        self.contents_frame: Optional[_Frame] = None
+        self.details_seen = False
+        self.textblock = NOT_SEEN
+        self.class_doc = _DocBlock()
+        self.member: Optional[_Member] = None
+        self.members: List[_Member] = []
+
+    # Text
+
+    def _collapse(self, data: str) -> str:
+        if not self.preserve_whitespace and not data.strip(ASCII_SPACES):
+            return "\n" if "\n" in data else " "
+        return data
+
+    def _flush(self):
+        if not self.pending:
+            return
+        data = self._collapse("".join(self.pending))
+        self.pending = []
+        if self.non_text:
+            return
+        if self.title == OPEN and self.title_first is None:
+            self.title_first = data
+        for sink in self.sinks:
+            sink.append(data)
+
+    def handle_data(self, data):
+        self.pending.append(data)
+
+    def handle_charref(self, name):
+        if name[:1] in ("x", "X"):
+            code, base = name[1:], 16
+        else:
+            code, base = name, 10
+        try:
+            number = int(code, base)
+            # Like bs4, read 128-159 as windows-1252 (what such pages mean).
+            if 128 <= number < 160:
+                self.pending.append(bytes([number]).decode("windows-1252"))
+            else:
+                self.pending.append(chr(number))
+        except (ValueError, OverflowError, UnicodeDecodeError):
+            self.pending.append("\N{REPLACEMENT CHARACTER}")
+
+    def handle_entityref(self, name):
+        self.pending.append(html5.get(name + ";", "&" + name))
+
+    def handle_comment(self, data):
+        self._flush()
+        # Comments aren't text, but the title lookup (find(text=True)) does
+        # return them.
+        if data and self.title == OPEN and self.title_first is None and not self.non_text:
+            self.title_first = self._collapse(data)
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.startswith("CDATA["):
+            self.pending.append(data[len("CDATA[") :])
+            self._flush()
+
+    def _add_sink(self, frame: _Frame) -> Sink:
+        sink: Sink = []
+        self.sinks.append(sink)
+        frame.sinks += 1
+        return sink
+
+    # Elements
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in VOID_ELEMENTS:
+            return
+        frame = _Frame(tag)
+        self.stack.append(frame)
+        if tag in NON_TEXT_ELEMENTS:
+            self.non_text += 1
+        elif tag in PRESERVE_WHITESPACE_ELEMENTS:
+            self.preserve_whitespace += 1
+
+        classes = []
+        element_id = None
+        for key, value in attrs:
+            if key == "class":
+                classes = (value or "").split()
+            elif key == "id":
+                element_id = value
+        if tag == "div":
+            self._start_div(frame, classes)
+        elif tag == "a":
+            if element_id == "details" and self.kept:
+                self.details_seen = True
+        elif tag == "span":
+            if self.member is not None and "mlabel" in classes:
+                self.member.labels.append(self._add_sink(frame))
+        elif tag == "table":
+            self._start_table(frame, classes)
+        elif tag == "tr":
+            self._start_tr(frame)
+        elif tag == "td":
+            self._start_td(frame, classes)
+        elif tag == "p":
+            self._start_p(frame)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag in VOID_ELEMENTS:
+            return
+        # Like bs4: close everything up to the most recent open element with
+        # this name, or ignore a stray end tag.
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i].tag == tag:
+                while len(self.stack) > i:
+                    self._pop()
+                return
+
+    def close(self):
+        super().close()
+        self._flush()
+        while self.stack:
+            self._pop()
+
+    def _pop(self):
+        frame = self.stack.pop()
+        if frame.sinks:
+            del self.sinks[-frame.sinks :]
+        if frame.tag in NON_TEXT_ELEMENTS:
+            self.non_text -= 1
+        elif frame.tag in PRESERVE_WHITESPACE_ELEMENTS:
+            self.preserve_whitespace -= 1
+        if frame.on_close is not None:
+            frame.on_close()
+
+    def _on_close(self, frame: _Frame, callback: Callable[[], None]):
+        previous = frame.on_close
+        if previous is None:
+            frame.on_close = callback
+        else:
+
+            def both():
+                callback()
+                previous()
+
+            frame.on_close = both
+
+    def _open_docs(self) -> List[_DocBlock]:
+        docs = []
+        if self.textblock == OPEN:
+            docs.append(self.class_doc)
+        if self.member is not None and self.member.memdoc == OPEN:
+            docs.append(self.member.doc)
+        return docs
+
+    def _start_div(self, frame: _Frame, classes: List[str]):
+        # Lookups only match descendants, so check the enclosing blocks
+        # before this element opens any of its own.
+        member = self.member
+        docs = self._open_docs()
+        if "line" in classes:
+            for doc in docs:
+                if doc.fragment == OPEN:
+                    doc.lines.append(self._add_sink(frame))
+        if "fragment" in classes:
+            for doc in docs:
+                if doc.fragment == NOT_SEEN:
+                    doc.fragment = OPEN
+                    self._on_close(frame, _closer(doc, "fragment"))
+        if "memdoc" in classes and member is not None and member.memdoc == NOT_SEEN:
+            member.memdoc = OPEN
+            self._on_close(frame, self._close_memdoc)
+        if "textblock" in classes and self.details_seen and self.kept:
+            if self.textblock == NOT_SEEN:
+                self.textblock = OPEN
+                self._on_close(frame, self._close_textblock)
+        if (
+            "memitem" in classes
+            and self.contents == OPEN
+            and self.stack[-2] is self.contents_frame
+        ):
+            self.member = _Member()
+            self._on_close(frame, self._close_member)
+        if "title" in classes or "contents" in classes:
+            self.kept += 1
+            self._on_close(frame, self._leave_kept)
+        if "title" in classes and self.title == NOT_SEEN:
+            self.title = OPEN
+            self.sinks.append(self.title_text)
+            frame.sinks += 1
+            self._on_close(frame, self._close_title)
+        if "contents" in classes and self.contents == NOT_SEEN:
+            self.contents = OPEN
+            self.contents_frame = frame
+            self._on_close(frame, self._close_contents)
+
+    def _leave_kept(self):
+        self.kept -= 1
+
+    def _close_title(self):
+        self.title = DONE
+
+    def _close_contents(self):
+        self.contents = DONE
+
+    def _close_textblock(self):
+        self.textblock = DONE
+
+    def _close_member(self):
+        self.members.append(self.member)
+        self.member = None
+
+    def _close_memdoc(self):
+        self.member.memdoc = DONE
+
+    def _start_p(self, frame: _Frame):
+        for doc in self._open_docs():
+            doc.paragraphs.append(self._add_sink(frame))
+
+    def _start_table(self, frame: _Frame, classes: List[str]):
+        member = self.member
+        if member is None:
+            return
+        if "memname" in classes and member.signature == NOT_SEEN:
+            member.signature = OPEN
+            self._on_close(frame, self._close_signature)
+        doc = member.doc
+        if member.memdoc != OPEN:
+            return
+        if "params" in classes and doc.params == NOT_SEEN:
+            doc.params = OPEN
+            doc.params_frame = frame
+            self._on_close(frame, _closer(doc, "params"))
+        if "markdownTable" in classes and doc.param_row is not None:
+            if doc.param_row.schema == NOT_SEEN:
+                doc.param_row.schema = OPEN
+                self._on_close(frame, _closer(doc.param_row, "schema"))
+
+    def _close_signature(self):
+        self.member.signature = DONE
+
+    def _start_tr(self, frame: _Frame):
+        member = self.member
+        if member is None:
+            return
+        if member.signature == OPEN:
+            row = _SignatureRow()
+            member.signature_rows.append(row)
+            member.open_signature_rows.append(row)
+            self._on_close(frame, member.open_signature_rows.pop)
+        doc = member.doc
+        if member.memdoc != OPEN:
+            return
+        if doc.params == OPEN and self.stack[-2] is doc.params_frame:
+            param_row = _ParamRow()
+            doc.param_rows.append(param_row)
+            doc.param_row = param_row
+            self._on_close(frame, _clearer(doc, "param_row"))
+        if doc.param_row is not None and doc.param_row.schema == OPEN:
+            frame.row = []
+            doc.param_row.schema_rows.append(frame.row)
+
+    def _start_td(self, frame: _Frame, classes: List[str]):
+        member = self.member
+        if member is None:
+            return
+        if "memname" in classes and member.memname is None:
+            member.memname = self._add_sink(frame)
+        for row in member.open_signature_rows:
+            if "memname" in classes and row.memname is None:
+                row.memname = self._add_sink(frame)
+            if "paramtype" in classes and row.paramtype is None:
+                row.paramtype = self._add_sink(frame)
+            if "paramname" in classes and row.paramname is None:
+                row.paramname = self._add_sink(frame)
+        param_row = member.doc.param_row
+        if member.memdoc == OPEN and param_row is not None:
+            param_row.tds.append(self._add_sink(frame))
+            parent = self.stack[-2]
+            if param_row.schema == OPEN and parent.row is not None:
+                parent.row.append(self._add_sink(frame))
+
+
+def _closer(obj, attr: str):
+    def close():
+        setattr(obj, attr, DONE)
+
+    return close
+
+
+def _clearer(obj, attr: str):
+    def clear():
+        setattr(obj, attr, None)
+
+    return clear
+
+
+def _example(doc: _DocBlock) -> str:
+    return "\n".join(_text(line) for line in doc.lines)
+
+
+def _signature_data(member: _Member) -> Dict:
+    func_data = {}
+    for row in member.signature_rows:
+        if row.memname is not None:
+            func_data["type"], func_data["name"], func_data["keyword"] = (
+                _clean_function_name(_text(row.memname))
+            )
+        if row.paramtype is not None:
+            param = {}
+            param["type"] = _parse_type(_text(row.paramtype))
+            assert row.paramname is not None
+            argument_name, default_value = _clean_argument_name(_text(row.paramname))
+            if argument_name:
+                param["name"] = argument_name
+                if default_value:
+                    param["default"] = default_value
+                if "params" not in func_data:
+                    func_data["params"] = []
+                func_data["params"].append(param)
+    return func_data
+
+
+def _memdoc_data(doc: _DocBlock) -> Dict:
+    func_data = {}
+    desc_lines = [line for line in (_text(p).strip() for p in doc.paragraphs) if line]
+    if desc_lines:
+        func_data["desc"] = "\n".join(desc_lines)
+    if doc.fragment != NOT_SEEN:
+        func_data["example"] = _example(doc)
+        func_data["beautify_example"] = True
+
+    param_docs = []
+    for param_row in doc.param_rows:
+        d = dict(
+            name=_text(param_row.tds[0]).strip(),
+            desc=_text(param_row.tds[1]).strip(),
+        )
+        if param_row.schema != NOT_SEEN:
+            schema = [
+                dict(
+                    name=_text(tds[0]).strip(),
+                    type=_text(tds[1]).strip(),
+                    desc=_text(tds[2]).strip(),
+                )
+                for tds in param_row.schema_rows
+                if len(tds) == 3
+            ]
+            if schema:
+                d["object_schema"] = schema
+        param_docs.append(d)
+    func_data["param_docs"] = param_docs
+    return func_data
+
+
+def _member_data(member: _Member) -> Dict:
+    func_data = {"name": None, "params": []}
+    assert member.signature != NOT_SEEN
+    func_data.update(_signature_data(member))
+    assert member.memdoc != NOT_SEEN
+    func_data.update(_memdoc_data(member.doc))
+
+    # Join the parameter documenation with the parameter dict
+    for param in func_data["params"]:
+        for param_doc in func_data["param_docs"]:
+            if param_doc["name"] == param["name"]:
+                param["desc"] = _clean_argument_desc(param_doc["desc"])
+                if "object_schema" in param_doc:
+                    param["object_schema"] = param_doc["object_schema"]
+    del func_data["param_docs"]
+    return func_data
+
+
+def _member_labels(member: _Member) -> List[str]:
+    labels = [_text(label).strip() for label in member.labels]
+    if "enum" not in labels:
+        if member.memname is not None and "enum" in _text(member.memname):
+            labels.append("enum")
+    return labels
+
+
+def parse_class_page(html: str) -> Dict:
+    """
+    Same result as tba_parser.parse_class_page_detailed, without a DOM.
+    """
+    parser = _ClassPageParser()
+    parser.feed(html)
+    parser.close()
+
+    assert parser.title != NOT_SEEN
+    class_data = {
+        "name": (parser.title_first or "")
+        .strip()
+        .replace("Class Reference", "")
+        .replace("Namespace Reference", "")
+        .replace("Struct Reference", "")
+        .strip(),
+        "is_namespace": "Namespace" in _text(parser.title_text),
+        "slots": [],
+        "props": [],
+        "enums": [],
+    }
+
+    desc = ""
+    example = ""
+    if parser.textblock != NOT_SEEN:
+        desc = "\n".join(_text(p).strip() for p in parser.class_doc.paragraphs)
+        if parser.class_doc.fragment != NOT_SEEN:
+            example = _example(parser.class_doc)
+    class_data["desc"], class_data["example"] = desc, example
+    if class_data["example"]:
+        class_data["beautify_example"] = True
+
+    assert parser.contents != NOT_SEEN
+
+    groups = {}
+    for member in parser.members:
+        group_name = _group_from_labels(_member_labels(member))
+        if not group_name:  # Skip invalid items (friends for example)
+            continue
+        groups.setdefault(group_name, []).append(_member_data(member))
+
+    for group_name, members in groups.items():
+        if group_name == "constructor":
+            class_data["constructor"] = members[0]
+        else:
+            class_data[group_name] = members
+    return class_data
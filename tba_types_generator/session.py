@@ -0,0 +1,297 @@
+import logging
+import os
+import threading
+import time
+import typing
+from pathlib import Path
+
+from . import (
+    _generate_ts_from_data,
+    _load_extra_ts_files,
+    format_outputs,
+    get_all_classes,
+    get_all_globals,
+    get_target_dir,
+)
+from .manifest import file_hash, get_inputs, is_up_to_date, load_manifest, save_manifest
+from .model import ClassInfo, Member
+from .overrides import Overrides, load_overrides
+from .page_store import get_store
+from .url_getter import fetch_scope, get_page_digest, record_urls
+
+logger = logging.getLogger(__name__)
+
+
+class GeneratorSession:
+    """
+    Generates many (host, version) targets with shared resources.  The
+    preambles and compiled overrides are kept until their files change (each
+    build checks their mtimes); the page store, the keep-alive connection
+    pool and the parse/example/type caches belong to the process and stay
+    warm from one target to the next.
+
+    Each build (a build(), generate_many() or generate() call) is a
+    fetch_scope of its own: cached pages are revalidated as the cache TTL
+    asks, at most once per build, so a long-lived session keeps honouring
+    it.
+
+    generate() may be called from several threads at once (e.g. by a build
+    server); concurrent calls for the same target run one after the other.
+    build() can also spread targets over worker processes, each with a
+    session of its own, and skips targets whose build manifest says they
+    are up to date.  The pages each target read are recorded on their own,
+    even when targets are built at the same time.
+    """
+
+    def __init__(
+        self,
+        override_dir: str = "./override",
+        output_dir: typing.Optional[typing.Union[str, Path]] = None,
+    ):
+        self.override_dir = override_dir
+        self.output_dir = Path(output_dir) if output_dir else None
+        self._lock = threading.Lock()
+        self._target_locks: typing.Dict[typing.Tuple[str, int], threading.Lock] = {}
+        self._extra_ts_files: typing.Optional[typing.Dict[str, str]] = None
+        self._extra_ts_key: typing.Optional[tuple] = None
+
+    @property
+    def extra_ts_files(self) -> typing.Dict[str, str]:
+        """
+        The override/*.ts preambles, read again whenever one of them is
+        added, removed or modified.
+        """
+        key = _ts_files_key(self.override_dir)
+        with self._lock:
+            if key != self._extra_ts_key:
+                self._extra_ts_files = _load_extra_ts_files(self.override_dir)
+                self._extra_ts_key = key
+            assert self._extra_ts_files is not None
+            return self._extra_ts_files
+
+    @property
+    def overrides(self) -> Overrides:
+        # load_overrides() recompiles only when the file's mtime or size
+        # changes.
+        return load_overrides(os.path.join(self.override_dir, "override.jsonc"))
+
+    def iter_classes(
+        self, host: str, version_num: int, failures=None, overrides: typing.Optional[Overrides] = None
+    ) -> typing.Iterator[ClassInfo]:
+        overrides = overrides or self.overrides
+        for data in get_all_classes(host, version_num, failures):
+            if overrides.apply(data):
+                yield data
+
+    def get_globals(self, host: str, version_num: int) -> typing.List[Member]:
+        return get_all_globals(host, version_num)
+
+    def _target_lock(self, host: str, version_num: int) -> threading.Lock:
+        with self._lock:
+            return self._target_locks.setdefault((host, version_num), threading.Lock())
+
+    def generate(
+        self,
+        host: str,
+        version_num: int,
+        format_paths: typing.Optional[typing.List[str]] = None,
+        failures: typing.Optional[list] = None,
+        previous_files: typing.Optional[typing.Dict[str, dict]] = None,
+        rendered: typing.Optional[typing.Dict[str, str]] = None,
+        overrides: typing.Optional[Overrides] = None,
+        extra_ts_files: typing.Optional[typing.Dict[str, str]] = None,
+    ) -> str:
+        """
+        Write the declarations for one target; returns the file written.
+        Formatting is deferred to the caller if `format_paths` is given
+        (see format_outputs); classes that were skipped are added to
+        `failures`.  `overrides` and `extra_ts_files` default to the
+        session's current ones.  See _generate_ts_from_data for the rest.
+        """
+        with self._target_lock(host, version_num), fetch_scope():
+            logger.info(f"Generating Typescript for {host}:{version_num}")
+            return _generate_ts_from_data(
+                host,
+                version_num,
+                self.iter_classes(host, version_num, failures, overrides),
+                self.get_globals(host, version_num),
+                extra_file_data=extra_ts_files or self.extra_ts_files,
+                output_dir=self.output_dir,
+                format_paths=format_paths,
+                previous_files=previous_files,
+                rendered=rendered,
+            )
+
+    def generate_many(self, targets: typing.Iterable[typing.Tuple[str, int]]) -> typing.List[str]:
+        """
+        Generate every target, then format all of them with one prettier run.
+        """
+        format_paths: typing.List[str] = []
+        with fetch_scope():
+            written = [self.generate(host, version_num, format_paths) for host, version_num in targets]
+        format_outputs(format_paths)
+        return written
+
+    def _build_target(self, host: str, version_num: int, force: bool = False) -> "TargetResult":
+        start = time.perf_counter()
+        ts_dir = get_target_dir(host, version_num, self.output_dir)
+        ts_filename = str(ts_dir / "index.d.ts")
+        try:
+            # The manifest must describe what this build applies, even if the
+            # files change while it runs.
+            overrides = self.overrides
+            extra_ts_files = self.extra_ts_files
+            inputs = get_inputs(overrides, extra_ts_files)
+            previous = load_manifest(ts_dir)
+            if not force and is_up_to_date(previous, inputs):
+                logger.info(f"{host}:{version_num} is up to date")
+                return TargetResult(
+                    host, version_num, ts_filename, [], time.perf_counter() - start, None, [], up_to_date=True
+                )
+        except Exception as e:
+            logger.exception(f"Failed to check {host}:{version_num}")
+            return TargetResult(host, version_num, None, [], time.perf_counter() - start, repr(e), [])
+
+        # Files are only left alone if the same code would format them the
+        # same way.
+        previous_files = previous["files"] if previous and previous["code"] == inputs["code"] else None
+        format_paths: typing.List[str] = []
+        failures: list = []
+        rendered: typing.Dict[str, str] = {}
+        try:
+            with record_urls() as urls:
+                path = self.generate(
+                    host, version_num, format_paths, failures, previous_files, rendered, overrides, extra_ts_files
+                )
+            pages = {url: get_page_digest(url) for url in sorted(urls)}
+        except Exception as e:
+            logger.exception(f"Failed to generate {host}:{version_num}")
+            return TargetResult(host, version_num, None, [], time.perf_counter() - start, repr(e), failures)
+        manifest = None
+        if None not in pages.values():
+            manifest = {
+                **inputs,
+                "pages": pages,
+                "files": {path: {"rendered": digest} for path, digest in rendered.items()},
+            }
+        return TargetResult(
+            host, version_num, path, format_paths, time.perf_counter() - start, None, failures, manifest
+        )
+
+    def build(
+        self,
+        targets: typing.Iterable[typing.Tuple[str, int]],
+        jobs: int = 1,
+        force: bool = False,
+    ) -> typing.List["TargetResult"]:
+        """
+        Generate every target, in `jobs` worker processes if more than one,
+        then format all outputs with one prettier run.  A failing target
+        doesn't stop the others; see TargetResult and format_report().
+        Targets that are up to date are skipped unless `force` is set.
+        """
+        targets = list(targets)
+        if jobs <= 1 or len(targets) <= 1:
+            with fetch_scope():
+                results = [self._build_target(host, version_num, force) for host, version_num in targets]
+        else:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # Create the page store once, before the workers
+            # open it; after that SQLite's WAL mode lets them share it.
+            get_store()
+            with ProcessPoolExecutor(
+                max_workers=jobs,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.override_dir, self.output_dir, logging.getLogger().level),
+            ) as executor:
+                hosts, version_nums = zip(*targets)
+                results = list(executor.map(_build_in_worker, hosts, version_nums, [force] * len(targets)))
+        if format_outputs([path for result in results for path in result.format_paths]):
+            for result in results:
+                _save_manifest(result)
+        return results
+
+
+def _save_manifest(result: "TargetResult"):
+    """
+    Record a target's manifest once its files are final.  Targets that
+    left classes out are built again next time.
+    """
+    if result.manifest is None or result.error or result.class_failures:
+        return
+    for path, hashes in result.manifest["files"].items():
+        hashes["output"] = file_hash(path)
+    save_manifest(os.path.dirname(result.path), result.manifest)
+
+
+def _ts_files_key(override_dir: str) -> tuple:
+    key = []
+    for filename in sorted(os.listdir(override_dir)):
+        if os.path.splitext(filename)[1] == ".ts":
+            stat = os.stat(os.path.join(override_dir, filename))
+            key.append((filename, stat.st_mtime_ns, stat.st_size))
+    return tuple(key)
+
+
+class TargetResult(typing.NamedTuple):
+    host: str
+    version_num: int
+    # index.d.ts, or None if the target failed.
+    path: typing.Optional[str]
+    format_paths: typing.List[str]
+    seconds: float
+    error: typing.Optional[str]
+    # ClassFailure for every class left out.
+    class_failures: list
+    # The build manifest to save once the outputs are formatted.
+    manifest: typing.Optional[dict] = None
+    # Skipped: nothing changed since the last build.
+    up_to_date: bool = False
+
+
+def format_report(results: typing.Sequence[TargetResult], wall_seconds: float) -> str:
+    lines = [f"{'Target':<20} {'Time':>8}  Result"]
+    for r in results:
+        if r.error:
+            outcome = f"FAILED: {r.error}"
+        elif r.up_to_date:
+            outcome = "up to date"
+        else:
+            outcome = "ok"
+            if r.class_failures:
+                skipped = ", ".join(f.name for f in r.class_failures)
+                outcome += f", skipped {len(r.class_failures)} class(es): {skipped}"
+        lines.append(f"{f'{r.host} {r.version_num}':<20} {r.seconds:>7.1f}s  {outcome}")
+    failed = sum(1 for r in results if r.error)
+    lines.append(f"{len(results)} targets, {failed} failed, {wall_seconds:.1f}s")
+    return "\n".join(lines)
+
+
+_worker_session: typing.Optional[GeneratorSession] = None
+
+
+def _init_worker(override_dir, output_dir, log_level):
+    global _worker_session
+    logging.basicConfig(level=log_level)
+    _worker_session = GeneratorSession(override_dir, output_dir)
+
+
+def _build_in_worker(host: str, version_num: int, force: bool) -> TargetResult:
+    assert _worker_session is not None
+    with fetch_scope():
+        return _worker_session._build_target(host, version_num, force)
+
+
+_default_session: typing.Optional[GeneratorSession] = None
+_default_session_lock = threading.Lock()
+
+
+def get_default_session() -> GeneratorSession:
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = GeneratorSession()
+        return _default_session
@@ -0,0 +1,591 @@
+import logging
+import re
+import typing
+
+logger = logging.getLogger(__name__)
+
+# Formats the declarations typescript_builder writes the way prettier does
+# with the settings prettify() passes (printWidth 80, 2-space indent,
+# semicolons, --trailing-comma none, --object-wrap collapse), so a build
+# doesn't need Node.  Only the subset of TypeScript found in .d.ts files is
+# understood; anything else raises FormatError.
+PRINT_WIDTH = 80
+INDENT = 2
+
+
+class FormatError(ValueError):
+    pass
+
+
+# Documents, as in prettier: strings, lists (concatenation) and the nodes
+# below.  A group is printed flat if it fits on the rest of the line, and
+# otherwise with its lines broken.
+
+
+class Group:
+    __slots__ = ("contents", "should_break")
+
+    def __init__(self, contents, should_break: bool = False):
+        self.contents = contents
+        self.should_break = should_break
+
+
+class Indent:
+    __slots__ = ("contents",)
+
+    def __init__(self, contents):
+        self.contents = contents
+
+
+class IfBreak:
+    __slots__ = ("break_contents", "flat_contents")
+
+    def __init__(self, break_contents, flat_contents=""):
+        self.break_contents = break_contents
+        self.flat_contents = flat_contents
+
+
+class Line:
+    __slots__ = ("soft", "hard")
+
+    def __init__(self, soft: bool = False, hard: bool = False):
+        self.soft = soft
+        self.hard = hard
+
+
+LINE = Line()
+SOFTLINE = Line(soft=True)
+HARDLINE = Line(hard=True)
+
+_FLAT, _BREAK = 0, 1
+
+
+def join(separator, docs: typing.Iterable) -> list:
+    parts = []
+    for i, doc in enumerate(docs):
+        if i:
+            parts.append(separator)
+        parts.append(doc)
+    return parts
+
+
+def _propagate_breaks(doc) -> bool:
+    """
+    Mark every group holding a hard line as broken; returns whether `doc`
+    holds one.
+    """
+    if isinstance(doc, str):
+        return False
+    if isinstance(doc, list):
+        found = False
+        for part in doc:
+            found = _propagate_breaks(part) or found
+        return found
+    if isinstance(doc, Group):
+        if _propagate_breaks(doc.contents):
+            doc.should_break = True
+        return doc.should_break
+    if isinstance(doc, Indent):
+        return _propagate_breaks(doc.contents)
+    if isinstance(doc, IfBreak):
+        found = _propagate_breaks(doc.break_contents)
+        return _propagate_breaks(doc.flat_contents) or found
+    return doc.hard
+
+
+def will_break(doc) -> bool:
+    if isinstance(doc, list):
+        return any(will_break(part) for part in doc)
+    if isinstance(doc, Group):
+        return doc.should_break or will_break(doc.contents)
+    if isinstance(doc, Indent):
+        return will_break(doc.contents)
+    if isinstance(doc, IfBreak):
+        return will_break(doc.break_contents) or will_break(doc.flat_contents)
+    return isinstance(doc, Line) and doc.hard
+
+
+def _fits(next_cmd, rest_cmds: list, width: int) -> bool:
+    rest_idx = len(rest_cmds)
+    cmds = [next_cmd]
+    while width >= 0:
+        if not cmds:
+            if rest_idx == 0:
+                return True
+            rest_idx -= 1
+            cmds.append(rest_cmds[rest_idx])
+            continue
+        ind, mode, doc = cmds.pop()
+        if isinstance(doc, str):
+            width -= len(doc)
+        elif isinstance(doc, list):
+            cmds.extend((ind, mode, part) for part in reversed(doc))
+        elif isinstance(doc, Indent):
+            cmds.append((ind, mode, doc.contents))
+        elif isinstance(doc, Group):
+            cmds.append((ind, _BREAK if doc.should_break else mode, doc.contents))
+        elif isinstance(doc, IfBreak):
+            cmds.append((ind, mode, doc.break_contents if mode == _BREAK else doc.flat_contents))
+        elif mode == _BREAK or doc.hard:
+            return True
+        elif not doc.soft:
+            width -= 1
+    return False
+
+
+def print_doc(doc, width: int = PRINT_WIDTH) -> str:
+    _propagate_breaks(doc)
+    out: typing.List[str] = []
+    pos = 0
+    cmds = [(0, _BREAK, doc)]
+    while cmds:
+        ind, mode, doc = cmds.pop()
+        if isinstance(doc, str):
+            out.append(doc)
+            pos += len(doc)
+        elif isinstance(doc, list):
+            cmds.extend((ind, mode, part) for part in reversed(doc))
+        elif isinstance(doc, Indent):
+            cmds.append((ind + INDENT, mode, doc.contents))
+        elif isinstance(doc, Group):
+            if mode == _FLAT and not doc.should_break:
+                cmds.append((ind, _FLAT, doc.contents))
+            elif not doc.should_break and _fits((ind, _FLAT, doc.contents), cmds, width - pos):
+                cmds.append((ind, _FLAT, doc.contents))
+            else:
+                cmds.append((ind, _BREAK, doc.contents))
+        elif isinstance(doc, IfBreak):
+            cmds.append((ind, mode, doc.break_contents if mode == _BREAK else doc.flat_contents))
+        elif mode == _FLAT and not doc.hard:
+            if not doc.soft:
+                out.append(" ")
+                pos += 1
+        else:
+            # Trailing whitespace is dropped, as prettier does.
+            while out and out[-1].endswith((" ", "\t")):
+                out[-1] = out[-1].rstrip(" \t")
+                if out[-1]:
+                    break
+                out.pop()
+            out.append("\n" + " " * ind)
+            pos = ind
+    return "".join(out)
+
+
+# Source
+
+_TOKEN_PAT = re.compile(
+    r"""
+    (?P<ws>\s+)
+    |(?P<comment>//[^\n]*|/\*.*?\*/)
+    |(?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+    |(?P<word>[A-Za-z_$~][\w$]*|\d+(?:\.\d+)?)
+    |(?P<punct>=>|\.\.\.|[{}()\[\]<>,;:?|&=.*])
+    """,
+    re.S | re.X,
+)
+KEYWORD_TYPES = frozenset(
+    ["any", "unknown", "never", "void", "undefined", "null", "object", "string", "number", "boolean", "symbol", "bigint"]
+)
+MODIFIERS = frozenset(["public", "private", "protected", "static", "readonly", "abstract", "declare"])
+
+
+class Token(typing.NamedTuple):
+    kind: str
+    text: str
+    # Newlines between the previous token and this one.
+    newlines: int
+
+
+def tokenize(text: str) -> typing.List[Token]:
+    tokens = []
+    newlines = 0
+    pos = 0
+    while pos < len(text):
+        m = _TOKEN_PAT.match(text, pos)
+        if not m:
+            raise FormatError(f"Unexpected {text[pos:pos + 20]!r}")
+        pos = m.end()
+        if m.lastgroup == "ws":
+            newlines += m.group().count("\n")
+            continue
+        tokens.append(Token(m.lastgroup, m.group(), newlines))
+        newlines = 0
+    return tokens
+
+
+class _Type(typing.NamedTuple):
+    doc: typing.Any
+    # keyword, ref, generic, literal, object, array, union, intersection
+    # or function; decides parentheses and hugging.
+    kind: str
+
+
+def _parens(t: _Type, kinds: typing.Tuple[str, ...]) -> typing.Any:
+    return ["(", t.doc, ")"] if t.kind in kinds else t.doc
+
+
+def _string_literal(text: str) -> str:
+    # Prettier prefers double quotes unless that means more escapes.
+    if text[0] == "'" and '"' not in text:
+        return '"' + text[1:-1].replace("\\'", "'") + '"'
+    return text
+
+
+def comment_doc(text: str):
+    """
+    Line comments are trimmed; jsdoc-style block comments (every line
+    starting with "*") are re-indented; other block comments are kept as is.
+    """
+    if text.startswith("//"):
+        return text.rstrip()
+    lines = ("*" + text[2:-2] + "*").split("\n")
+    if len(lines) < 2 or not all(line.lstrip().startswith("*") for line in lines):
+        return text
+    lines = text[2:-2].split("\n")
+    last = len(lines) - 1
+    printed = [lines[0].rstrip()] + [
+        " " + (line.strip() if i < last else line.lstrip()) for i, line in enumerate(lines[1:], 1)
+    ]
+    return ["/*", join(HARDLINE, printed), "*/"]
+
+
+class _Param(typing.NamedTuple):
+    doc: typing.Any
+    # A lone parameter with an object type is "hugged": (opts: {...}).
+    huggable: bool
+
+
+def params_doc(params: typing.List[_Param]):
+    if not params:
+        return "()"
+    if len(params) == 1 and params[0].huggable:
+        return ["(", params[0].doc, ")"]
+    return ["(", Indent([SOFTLINE, join([",", LINE], [p.doc for p in params])]), SOFTLINE, ")"]
+
+
+def signature_doc(params: typing.List[_Param], returns: typing.Optional[_Type], arrow: bool = False):
+    """
+    Parameters and return type of a method, function or function type.
+    The parameters get a group of their own only when there is one of them
+    and the return type is an object, or will break anyway.
+    """
+    printed = params_doc(params)
+    if returns is None:
+        return Group(printed)
+    returns_doc = [" => " if arrow else ": ", returns.doc]
+    if len(params) == 1 and (returns.kind == "object" or will_break(returns.doc)):
+        printed = Group(printed)
+    return Group([printed, returns_doc])
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    # Tokens
+
+    def _peek(self, offset: int = 0) -> typing.Optional[Token]:
+        pos = self.pos + offset
+        if pos >= len(self.tokens):
+            return None
+        token = self.tokens[pos]
+        if token.kind == "comment":
+            raise FormatError(f"Comment in an unsupported position: {token.text[:40]!r}")
+        return token
+
+    def _at(self, text: str, offset: int = 0) -> bool:
+        # Only a lookahead: a comment here (e.g. the doc comment of the next
+        # member, where the separator is optional) is left to _items.
+        pos = self.pos + offset
+        if pos >= len(self.tokens):
+            return False
+        token = self.tokens[pos]
+        return token.text == text and token.kind not in ("string", "comment")
+
+    def _accept(self, text: str) -> bool:
+        if self._at(text):
+            self.pos += 1
+            return True
+        return False
+
+    def _take(self, text: typing.Optional[str] = None, kind: typing.Optional[str] = None) -> str:
+        token = self._peek()
+        if token is None or (text is not None and token.text != text) or (kind is not None and token.kind != kind):
+            found = token.text if token else "end of input"
+            raise FormatError(f"Expected {text or kind}, found {found!r}")
+        self.pos += 1
+        return token.text
+
+    # Types
+
+    def type(self) -> _Type:
+        leading = self._accept("|")
+        parts = [self._intersection()]
+        while self._accept("|"):
+            parts.append(self._intersection())
+        if len(parts) == 1 and not leading:
+            return parts[0]
+        printed = [_parens(p, ("function",)) for p in parts]
+        code = [IfBreak([SOFTLINE, "| "]), join([LINE, "| "], printed)]
+        return _Type(Group(Indent(code)), "union")
+
+    def _intersection(self) -> _Type:
+        parts = [self._postfix()]
+        while self._accept("&"):
+            parts.append(self._postfix())
+        if len(parts) == 1:
+            return parts[0]
+        printed = [_parens(p, ("function", "union")) for p in parts]
+        return _Type(join(" & ", printed), "intersection")
+
+    def _postfix(self) -> _Type:
+        t = self._primary()
+        while self._at("[") and self._at("]", 1):
+            self.pos += 2
+            t = _Type([_parens(t, ("function", "union", "intersection")), "[]"], "array")
+        return t
+
+    def _primary(self) -> _Type:
+        if self._at("("):
+            start = self.pos
+            try:
+                params = self.params()
+                self._take("=>")
+            except FormatError:
+                self.pos = start
+            else:
+                return _Type(signature_doc(params, self.type(), arrow=True), "function")
+            self._take("(")
+            t = self.type()
+            self._take(")")
+            return t
+        if self._at("{"):
+            return self._object_type()
+        token = self._peek()
+        if token is None:
+            raise FormatError("Expected a type, found end of input")
+        if token.kind == "string":
+            self.pos += 1
+            return _Type(_string_literal(token.text), "literal")
+        name = self._take(kind="word")
+        while self._at("."):
+            self.pos += 1
+            name += "." + self._take(kind="word")
+        if not self._accept("<"):
+            if name in KEYWORD_TYPES:
+                return _Type(name, "keyword")
+            return _Type(name, "literal" if name[0].isdigit() else "ref")
+        args = [self.type()]
+        while self._accept(","):
+            args.append(self.type())
+        self._take(">")
+        if len(args) == 1 and args[0].kind in ("object", "keyword", "ref"):
+            printed = ["<", args[0].doc, ">"]
+        else:
+            printed = Group(["<", Indent([SOFTLINE, join([",", LINE], [a.doc for a in args])]), SOFTLINE, ">"])
+        return _Type([name, printed], "generic")
+
+    def params(self) -> typing.List[_Param]:
+        self._take("(")
+        params = []
+        while not self._at(")"):
+            rest = self._accept("...")
+            name = self._take(kind="word")
+            optional = self._accept("?")
+            param_type = self.type() if self._accept(":") else None
+            doc = ["..." if rest else "", name, "?" if optional else ""]
+            if param_type is not None:
+                doc += [": ", param_type.doc]
+            huggable = not rest and param_type is not None and param_type.kind == "object"
+            params.append(_Param(doc, huggable))
+            if not self._accept(","):
+                break
+        self._take(")")
+        return params
+
+    # Blocks
+
+    def _items(self, parse_one, close: typing.Optional[str]):
+        """
+        Parse members/statements up to `close`, keeping comments.  Returns
+        [(doc, is_comment, blank_line_after, same_line)] in source order.
+        """
+        items = []
+        while self.pos < len(self.tokens):
+            token = self.tokens[self.pos]
+            newlines = token.newlines
+            if token.kind == "comment":
+                self.pos += 1
+                items.append([comment_doc(token.text), True, False, bool(items) and not newlines])
+            elif close is not None and token.text == close:
+                break
+            else:
+                items.append([parse_one(), False, False, False])
+            if self.pos < len(self.tokens) and self.tokens[self.pos].newlines > 1:
+                items[-1][2] = True
+        if close is not None:
+            self._take(close)
+        return items
+
+    def _sequence(self, parse_one, close: typing.Optional[str]):
+        """
+        Statements or class members: one per line, keeping (at most) one
+        blank line wherever the source had any.
+        """
+        parts = []
+        items = self._items(parse_one, close)
+        for i, (doc, _, blank_after, same_line) in enumerate(items):
+            if i:
+                if same_line:
+                    parts.append(" ")
+                else:
+                    parts.append(HARDLINE)
+                    if items[i - 1][2]:
+                        parts.append(HARDLINE)
+            parts.append(doc)
+        return parts
+
+    def _body(self, parse_one):
+        self._take("{")
+        parts = self._sequence(parse_one, "}")
+        if not parts:
+            return "{}"
+        return ["{", Indent([HARDLINE, parts]), HARDLINE, "}"]
+
+    def _object_type(self, should_break: bool = False) -> _Type:
+        self._take("{")
+        items = self._items(self._type_member, "}")
+        if not items:
+            return _Type("{}", "object")
+        members = []
+        leading: list = []
+        for doc, is_comment, blank_after, _ in items:
+            if is_comment:
+                leading += [doc, HARDLINE]
+                if blank_after:
+                    leading.append(HARDLINE)
+                continue
+            members.append([leading + [doc], blank_after])
+            leading = []
+        if not members:
+            raise FormatError("Object type with only comments")
+        parts = []
+        for i, (doc, blank_after) in enumerate(members):
+            parts.append(doc)
+            if i < len(members) - 1:
+                parts += [";", LINE]
+                if blank_after:
+                    parts.append(SOFTLINE)
+        if leading:
+            parts += [";", HARDLINE] + leading[:-1]
+        doc = Group(["{", Indent([LINE, parts]), IfBreak(";"), LINE, "}"], should_break)
+        return _Type(doc, "object")
+
+    def _member_name(self) -> str:
+        token = self._peek()
+        if token is None or token.kind not in ("word", "string"):
+            raise FormatError(f"Expected a member name, found {token.text if token else 'end of input'!r}")
+        self.pos += 1
+        return _string_literal(token.text) if token.kind == "string" else token.text
+
+    def _index_signature(self):
+        self._take("[")
+        key = self._take(kind="word")
+        self._take(":")
+        key_type = self.type()
+        self._take("]")
+        optional = self._accept("?")
+        self._take(":")
+        return ["[", key, ": ", key_type.doc, "]", "?" if optional else "", ": ", self.type().doc]
+
+    def _member(self, modifiers: typing.List[str]):
+        """
+        A property, method or index signature, without the separator.
+        """
+        prefix = "".join(m + " " for m in modifiers)
+        if self._at("["):
+            return [prefix, self._index_signature()]
+        name = self._member_name()
+        optional = "?" if self._accept("?") else ""
+        if self._at("("):
+            params = self.params()
+            returns = self.type() if self._accept(":") else None
+            return [prefix, name, optional, signature_doc(params, returns)]
+        if self._accept(":"):
+            return [prefix, name, optional, ": ", self.type().doc]
+        return [prefix, name, optional]
+
+    def _type_member(self):
+        doc = self._member([])
+        if not self._accept(";"):
+            self._accept(",")
+        return doc
+
+    def _class_member(self):
+        modifiers = []
+        while (
+            self._peek() is not None
+            and self._peek().text in MODIFIERS
+            and self._peek(1) is not None
+            and self._peek(1).kind in ("word", "string")
+        ):
+            modifiers.append(self._take())
+        doc = self._member(modifiers)
+        self._accept(";")
+        return [doc, ";"]
+
+    # Statements
+
+    def statement(self):
+        declare = "declare " if self._accept("declare") else ""
+        keyword = self._take(kind="word")
+        if keyword == "class":
+            name = self._take(kind="word")
+            heritage = []
+            if self._accept("extends"):
+                heritage = [" extends ", self.type().doc]
+            return [declare, "class ", name, heritage, " ", self._body(self._class_member)]
+        if keyword in ("namespace", "module"):
+            name = self._take(kind="word")
+            while self._accept("."):
+                name += "." + self._take(kind="word")
+            return [declare, keyword, " ", name, " ", self._body(self.statement)]
+        if keyword == "interface":
+            name = self._take(kind="word")
+            heritage = []
+            if self._accept("extends"):
+                bases = [self.type().doc]
+                while self._accept(","):
+                    bases.append(self.type().doc)
+                heritage = [" extends ", join(", ", bases)]
+            return [declare, "interface ", name, heritage, " ", self._object_type(should_break=True).doc]
+        if keyword == "type":
+            name = self._take(kind="word")
+            self._take("=")
+            alias = self.type()
+            self._accept(";")
+            return [declare, "type ", name, " = ", alias.doc, ";"]
+        if keyword in ("var", "let", "const"):
+            name = self._take(kind="word")
+            annotation = [": ", self.type().doc] if self._accept(":") else []
+            self._accept(";")
+            return [declare, keyword, " ", name, annotation, ";"]
+        if keyword == "function":
+            name = self._take(kind="word")
+            params = self.params()
+            returns = self.type() if self._accept(":") else None
+            self._accept(";")
+            return [declare, "function ", name, signature_doc(params, returns), ";"]
+        raise FormatError(f"Unsupported statement {keyword!r}")
+
+
+def format_typescript(text: str) -> str:
+    """
+    Format a sequence of declarations; raises FormatError for anything
+    outside the supported subset.
+    """
+    parser = _Parser(text)
+    doc = parser._sequence(parser.statement, None)
+    return print_doc(doc).strip("\n") + "\n"
@@ -0,0 +1,215 @@
+import functools
+import logging
+import re
+import typing
+
+logger = logging.getLogger(__name__)
+
+# Type strings repeat heavily (a few hundred distinct ones across tens of
+# thousands of members), so every conversion here is memoized.
+CACHE_SIZE = 4096
+
+
+# JSDoc types (extended docs), e.g. "Array.<Object.<string, number>>|null"
+
+_JSDOC_TOKEN = re.compile(r"\s*(\.?<|>|,|\||\(|\)|\[\]|[^\s.<>,|()\[\]]+(?:\.[^\s.<>,|()\[\]]+)*)")
+# Whole expressions with a hand-written translation (whitespace removed).
+JSDOC_SPECIAL_CASES = {
+    "boolean|function": "boolean | ((...args: any[]) => boolean)",
+}
+FUNCTION_TYPE = "(...args: any[]) => any"
+
+
+class TypeExprError(ValueError):
+    pass
+
+
+def _tokenize_jsdoc(txt: str) -> typing.List[str]:
+    tokens = []
+    pos = 0
+    while pos < len(txt):
+        m = _JSDOC_TOKEN.match(txt, pos)
+        if not m:
+            if txt[pos:].strip():
+                raise TypeExprError(f"Unexpected {txt[pos:]!r} in {txt!r}")
+            break
+        tokens.append(m.group(1))
+        pos = m.end()
+    return tokens
+
+
+class _JSDocParser:
+    """
+    union := term ("|" term)*
+    term  := ("(" union ")" | name [("<" | ".<") union ("," union)* ">"]) "[]"*
+
+    Each rule returns (typescript, needs_parens), needs_parens being set
+    for unions and function types that can't be suffixed with "[]" as is.
+    """
+
+    def __init__(self, txt: str):
+        self.txt = txt
+        self.tokens = _tokenize_jsdoc(txt)
+        self.pos = 0
+
+    def _peek(self) -> typing.Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _take(self, expected: typing.Optional[str] = None) -> str:
+        token = self._peek()
+        if token is None or (expected is not None and token != expected):
+            raise TypeExprError(f"Expected {expected or 'a type'} in {self.txt!r}")
+        self.pos += 1
+        return token
+
+    def parse(self) -> str:
+        result, _ = self._union()
+        if self._peek() is not None:
+            raise TypeExprError(f"Unexpected {self._peek()!r} in {self.txt!r}")
+        return result
+
+    def _union(self) -> typing.Tuple[str, bool]:
+        terms = [self._term()]
+        while self._peek() == "|":
+            self._take()
+            terms.append(self._term())
+        if len(terms) == 1:
+            return terms[0]
+        # Function types need parens inside a union; nested unions don't.
+        return " | ".join(_wrap(t) if t[0] == FUNCTION_TYPE else t[0] for t in terms), True
+
+    def _term(self) -> typing.Tuple[str, bool]:
+        if self._peek() == "(":
+            self._take()
+            term = self._union()
+            self._take(")")
+        else:
+            name = self._take()
+            if name in ("<", ".<", ">", ",", "|", ")", "[]"):
+                raise TypeExprError(f"Unexpected {name!r} in {self.txt!r}")
+            args = []
+            if self._peek() in ("<", ".<"):
+                self._take()
+                args.append(self._union())
+                while self._peek() == ",":
+                    self._take()
+                    args.append(self._union())
+                self._take(">")
+            term = _render_generic(name, args)
+        while self._peek() == "[]":
+            self._take()
+            term = f"{_wrap(term)}[]", False
+        return term
+
+
+def _wrap(term: typing.Tuple[str, bool]) -> str:
+    text, needs_parens = term
+    return f"({text})" if needs_parens else text
+
+
+def _render_generic(name: str, args: typing.List[typing.Tuple[str, bool]]) -> typing.Tuple[str, bool]:
+    if name == "Array":
+        if not args:
+            return "any[]", False
+        if len(args) == 1:
+            return f"{_wrap(args[0])}[]", False
+    elif name == "Object" and len(args) == 2:
+        return f"{{[key: {args[0][0]}] : {args[1][0]}}}", False
+    elif name == "function" and not args:
+        return FUNCTION_TYPE, True
+    if not args:
+        return name, False
+    return f"{name}<{', '.join(arg[0] for arg in args)}>", False
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def jsdoc_to_ts(txt: str) -> str:
+    """
+    Translate a JSDoc type expression to TypeScript.  Text that isn't a
+    type expression is returned unchanged.
+    """
+    special = JSDOC_SPECIAL_CASES.get("".join(txt.split()))
+    if special is not None:
+        return special
+    try:
+        return _JSDocParser(txt).parse()
+    except TypeExprError as e:
+        logger.debug(f"Leaving type as is: {e}")
+        return txt
+
+
+# Doxygen member signatures, e.g. "virtual QString Foo::name"
+
+FUNC_KEYWORD_PAT = re.compile(r"^(?P<keyword>virtual|static) ")
+FUNC_NAMESPACED_NAME_PAT = re.compile(r"(?:[a-z0-9_]+::)?(?P<name>[~a-z0-9_]+)$", flags=re.I)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def split_function_name(txt: str) -> typing.Tuple[str, str, typing.Optional[str]]:
+    """
+    Split a doxygen memname into (return type, name, keyword).
+    """
+    txt = txt.replace("Q_INVOKABLE", "")
+    m = FUNC_KEYWORD_PAT.search(txt.strip())
+    keyword = None
+    if m:
+        txt = FUNC_KEYWORD_PAT.sub("", txt.strip()).strip()
+        keyword = m.group("keyword")
+    m = FUNC_NAMESPACED_NAME_PAT.search(txt.strip())
+    assert m
+    # if m:
+    func_name = m.group("name")
+    txt = FUNC_NAMESPACED_NAME_PAT.sub("", txt.strip()).strip()
+    if not txt:
+        type_name = "void"
+    elif " " in txt:
+        # NOTE: There is a common mistake in the documentation
+        # Where the actual field name is accidentally in the type
+        try:
+            type_name, func_name = tuple(txt.split(" "))
+        except ValueError:
+            logger.error("Failed to parse %s into tuple", txt)
+            type_name = txt
+    else:
+        type_name = txt
+    return type_name, func_name, keyword
+
+
+# Parsed types (either parser) to the types written in the declarations
+
+_POINTER_PAT = re.compile(r"[\*&]")
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def convert_single_type(type_name: str) -> str:
+    # Cleanup whitespace and remove pointer/reference symbols
+    type_name = _POINTER_PAT.sub("", type_name)
+    # FIXME: May want static (but is not part of type in TS)
+    type_name = type_name.replace("virtual", "").replace("static", "")
+    type_name = type_name.strip()
+    if "unsigned" in type_name or type_name == "integer":
+        type_name = "int"
+    if not type_name:
+        type_name = "void"
+    if type_name == "...":
+        type_name = "any"
+    assert type_name != "virtual"
+    # Convert native types to Javascript types
+    if type_name == "String":
+        type_name = "string"
+    elif type_name == "bool":
+        type_name = "boolean"
+    return type_name
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def convert_type(type_name: str) -> str:
+    if " or " in type_name:
+        types = [t.strip() for t in type_name.split(" or ")]
+    else:
+        types = [type_name]
+    types = [convert_single_type(t) for t in types]
+    if len(types) == 1:
+        return types[0]
+    else:
+        return "|".join(types)
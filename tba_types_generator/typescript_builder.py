@@ -2,41 +2,20 @@ import re
 import textwrap
 import typing
 
+from .examples import get_example
+from .model import ClassInfo, Member, Param
+from .type_expr import convert_type
+
 MAX_WIDTH = 100
-RESERVED_WORDS = ["void"]
-
-
-def _convert_single_type(type_name: str):
-    # Cleanup whitespace and remove pointer/reference symbols
-    type_name = re.sub(r"[\*&]", "", type_name)
-    # FIXME: May want static (but is not part of type in TS)
-    type_name = type_name.replace("virtual", "").replace("static", "")
-    type_name = type_name.strip()
-    if "unsigned" in type_name or type_name == "integer":
-        type_name = "int"
-    if not type_name:
-        type_name = "void"
-    if type_name == "...":
-        type_name = "any"
-    assert type_name != "virtual"
-    # Convert native types to Javascript types
-    if type_name == "String":
-        type_name = "string"
-    elif type_name == "bool":
-        type_name = "boolean"
-    return type_name
-
-
-def convert_type(type_name: str):
-    if " or " in type_name:
-        types = [t.strip() for t in type_name.split(" or ")]
-    else:
-        types = [type_name]
-    types = [_convert_single_type(t) for t in types]
-    if len(types) == 1:
-        return types[0]
-    else:
-        return "|".join(types)
+RESERVED_WORDS = frozenset(["void"])
+
+# Printable ASCII only: such a line, if it fits in MAX_WIDTH, comes out of
+# textwrap.wrap() unchanged apart from trailing spaces.
+_NEEDS_TEXTWRAP = re.compile(r"[^\x20-\x7e]")
+
+RESERVED_PREFIX = "// /* Invalid - Reserved word */"
+INVALID_OVERRIDE_PREFIX = "// /* Invalid - Overriding method in parent class with different parameters */"
+DUPLICATE_PREFIX = "// /* Invalid - Duplicate property name */ "
 
 
 def convert_desc(desc_inp: str):
@@ -56,75 +35,93 @@ def convert_value(value: typing.Any):
     return VALUE_LITERAL_MAP.get(value, value)
 
 
-def write_jsdoc(f: typing.TextIO, obj: dict[str, typing.Any]):
-    f.write("\n/**")
-    # f.write("\n* {}".format(obj['name']))
-    if "desc" in obj:
-        for line in obj["desc"].split("\n"):
-            desc = "\n* ".join(textwrap.wrap(line, width=MAX_WIDTH))
-            f.write("\n* {}".format(desc))
-    for param in obj.get("params", []):
-        f.write("\n* @param {{{0}}}".format(convert_type(param["type"])))
-        if "default" in param:
-            f.write(" [{0}={1}]".format(param["name"], convert_value(param["default"])))
-        else:
-            f.write(" {0}".format(param["name"]))
-        if "desc" in param:
-            f.write(" {0}".format(convert_desc(param["desc"])))
-    if obj.get("type", None):
-        f.write("\n* @returns {{{0}}}".format(convert_type(obj["type"])))
-    if obj.get("url", None):
-        f.write("\n* {{@link {0}}}".format(obj["url"]))
-    if obj.get("note", None):
-        f.write("\n* Note: {0}".format(obj["note"]))
-    if obj.get("example", None):
-        f.write("\n* @example")
-        for line in obj["example"].split("\n"):
-            f.write("\n* {0}".format(line))
+def wrap_line(line: str) -> list[str]:
+    """
+    textwrap.wrap(line, width=MAX_WIDTH), skipping textwrap for the short
+    plain lines that make up most descriptions.
+    """
+    if len(line) <= MAX_WIDTH and not _NEEDS_TEXTWRAP.search(line):
+        line = line.rstrip(" ")
+        return [line] if line else []
+    return textwrap.wrap(line, width=MAX_WIDTH)
+
+
+def emit_jsdoc(out: list[str], obj: typing.Union[ClassInfo, Member]):
+    """
+    Append the doc comment for `obj` to `out`.
+    """
+    out.append("\n/**")
+    if obj.desc is not None:
+        for line in obj.desc.split("\n"):
+            out.append("\n* ")
+            out.append("\n* ".join(wrap_line(line)))
+    if isinstance(obj, Member):
+        for param in obj.params:
+            out.append(f"\n* @param {{{convert_type(param.type)}}}")
+            if param.default is not None:
+                out.append(f" [{param.name}={convert_value(param.default)}]")
+            else:
+                out.append(f" {param.name}")
+            if param.desc is not None:
+                out.append(f" {convert_desc(param.desc)}")
+        if obj.type:
+            out.append(f"\n* @returns {{{convert_type(obj.type)}}}")
+    if obj.url:
+        out.append(f"\n* {{@link {obj.url}}}")
+    if obj.note:
+        out.append(f"\n* Note: {obj.note}")
+    if example := get_example(obj):
+        out.append("\n* @example\n* ")
+        out.append(example.replace("\n", "\n* "))
+    out.append("\n*/")
+
 
-    f.write("\n*/")
+def write_jsdoc(f: typing.TextIO, obj: typing.Union[ClassInfo, Member]):
+    out: list[str] = []
+    emit_jsdoc(out, obj)
+    f.write("".join(out))
 
 
-def is_optional(p: dict[str, typing.Any]):
-    return p.get("default", None) or "default" in p.get("desc", "").lower()
+def is_optional(p: Param):
+    return p.default or "default" in (p.desc or "").lower()
 
 
-def build_type(prop: dict[str, typing.Any], as_param: bool = False):
-    if "object_schema" in prop:
+def build_type(prop: typing.Union[Member, Param], as_param: bool = False):
+    if prop.object_schema is not None:
         type_str = "{"
-        for field_data in prop["object_schema"]:
+        for field_data in prop.object_schema:
             # If the type is being returned from a function,
             # Treat all the fields as required.  If it's as a parameter, make them optional
             required = not as_param
-            if field_data.get("desc", None):
-                type_str += "\n/**\n* {0}\n*/".format(field_data["desc"])
-                if "required" in field_data["desc"]:
+            if field_data.desc:
+                type_str += "\n/**\n* {0}\n*/".format(field_data.desc)
+                if "required" in field_data.desc:
                     required = True
-            field_name = field_data["name"]
+            field_name = field_data.name
             if not required:
                 field_name += "?"
-            type_str += "\n{}:{}".format(field_name, convert_type(field_data["type"]))
+            type_str += "\n{}:{}".format(field_name, convert_type(field_data.type))
         type_str += "}"
     else:
-        type_str = convert_type(prop["type"])
+        type_str = convert_type(prop.type)
     return type_str
 
 
-def build_signal_type(signal: dict[str, typing.Any]):
+def build_signal_type(signal: Member):
     params = build_params_list(signal)
     sig = ",".join(["{}: {}".format(s[0], s[1]) for s in params])
     type_str = build_type(signal)
     return "QSignal<({0}) => {1}>".format(sig, type_str)
 
 
-def build_params_list(slot: dict[str, typing.Any]):
+def build_params_list(slot: Member):
     params: list[tuple[str, str]] = []
     broke_optional = False
-    for p in slot["params"]:
+    for p in slot.params:
         if not broke_optional:
             if is_optional(p):
                 broke_optional = True
-        param_name = p["name"]
+        param_name = p.name
         if broke_optional:
             param_name += "?"
         param_type = build_type(p, as_param=True)
@@ -132,133 +129,121 @@ def build_params_list(slot: dict[str, typing.Any]):
     return params
 
 
-def write_ts_from_interface(data: dict[str, typing.Any], f: typing.TextIO):
-    type_str = build_type(data)
-    write_jsdoc(f, data)
-    f.write(f"\ndeclare interface {data['name']} {type_str}")
+def render_interface(data: Member) -> str:
+    out: list[str] = []
+    emit_jsdoc(out, data)
+    out.append(f"\ndeclare interface {data.name} {build_type(data)}")
+    return "".join(out)
 
 
-def write_ts_from_class(cls: dict[str, typing.Any], f: typing.TextIO):
-    is_module = (
-        cls.get("is_namespace", False)
-        or cls.get("parent") in ["GlobalObject", "BAPP_SpecialFolders"]
-        or cls["name"] == "CELIO"
-    )
-    # is_static = not 'parent' in cls or cls['parent'] in [
-    #     'GlobalObject', 'BAPP_SpecialFolders']
-    is_static = False
-    has_namespace = cls.get("namespace", None) is not None
+def write_ts_from_interface(data: Member, f: typing.TextIO):
+    f.write(render_interface(data))
+
+
+# Every ClassInfo field render_class_body() reads; the body is the same for
+# any two classes that agree on these.
+CLASS_BODY_KEYS = ("name", "parent", "is_namespace", "namespace", "slots", "signals", "props")
+
+
+def _is_module(cls: ClassInfo) -> bool:
+    return cls.is_namespace or cls.parent in ["GlobalObject", "BAPP_SpecialFolders"] or cls.name == "CELIO"
+
+
+def render_class_header(cls: ClassInfo) -> str:
+    """
+    The doc comment and opening line of a class (or namespace).
+    """
+    is_module = _is_module(cls)
+    has_namespace = cls.namespace is not None
+    out: list[str] = []
+    emit = out.append
     if has_namespace:
-        f.write("\ndeclare namespace {} {{".format(cls["namespace"]))
-    static_str = ""
-    if is_static:
-        static_str = "static "
-    # is_module = not 'parent' in cls or cls['parent'] in ['GlobalObject', 'BAPP_SpecialFolders']
-    write_jsdoc(f, cls)
+        emit(f"\ndeclare namespace {cls.namespace} {{")
+    emit_jsdoc(out, cls)
     if is_module:
         if has_namespace:
-            f.write("\nnamespace {} {{".format(cls["name"]))
+            emit(f"\nnamespace {cls.name} {{")
         else:
-            f.write("\ndeclare namespace {} {{".format(cls["name"]))
+            emit(f"\ndeclare namespace {cls.name} {{")
     else:
-        # if cls['name'] == 'File':
-        #     f.write('\ndeclare interface {} extends {} {{'.format(cls['name'], cls['parent']))
-        # else:
-        declare_prefix = "declare "
-        if has_namespace:
-            declare_prefix = ""
-        if cls.get("parent", None):
-            f.write(
-                "\n{}class {} extends {} {{".format(
-                    declare_prefix, cls["name"], cls["parent"]
-                )
-            )
+        declare_prefix = "" if has_namespace else "declare "
+        if cls.parent:
+            emit(f"\n{declare_prefix}class {cls.name} extends {cls.parent} {{")
         else:
-            f.write("\n{}class {} {{".format(declare_prefix, cls["name"]))
-    used_names: list[str] = []
-    for slot in cls["slots"]:
-        if slot["name"].startswith("~"):
+            emit(f"\n{declare_prefix}class {cls.name} {{")
+    return "".join(out)
+
+
+def render_class_body(cls: ClassInfo) -> str:
+    """
+    The members and closing braces of a class; only reads CLASS_BODY_KEYS.
+    """
+    is_module = _is_module(cls)
+    # is_static = not 'parent' in cls or cls['parent'] in [
+    #     'GlobalObject', 'BAPP_SpecialFolders']
+    is_static = False
+    static_str = "static " if is_static else ""
+    has_namespace = cls.namespace is not None
+    out: list[str] = []
+    emit = out.append
+    used_names: set[str] = set()
+    for slot in cls.slots:
+        name = slot.name
+        if name.startswith("~"):
             continue  # Ignore destructor
         prefix = ""
-        if slot["name"] not in used_names:
-            used_names.append(slot["name"])
-        if slot["name"] in RESERVED_WORDS:
-            prefix = "// /* Invalid - Reserved word */"
-        if slot.get("invalid", False):
-            prefix = "// /* Invalid - Overriding method in parent class with different parameters */"
-        write_jsdoc(f, slot)
-        params = build_params_list(slot)
-        sig = ",".join(["{}: {}".format(p[0], p[1]) for p in params])
+        used_names.add(name)
+        if name in RESERVED_WORDS:
+            prefix = RESERVED_PREFIX
+        if slot.invalid:
+            prefix = INVALID_OVERRIDE_PREFIX
+        emit_jsdoc(out, slot)
+        sig = ",".join([f"{p[0]}: {p[1]}" for p in build_params_list(slot)])
         type_str = build_type(slot)
         if is_module:
-            f.write(
-                "\nfunction {name} ({sig}): {type};\n".format(
-                    name=slot["name"], sig=sig, type=type_str
-                )
-            )
+            emit(f"\nfunction {name} ({sig}): {type_str};\n")
+        elif name == cls.name:
+            emit(f"\nconstructor ({sig});\n")
         else:
-            if slot["name"] == cls["name"]:
-                f.write(
-                    "\nconstructor ({sig});\n".format(
-                        sig=sig,
-                    )
-                )
-            else:
-                f.write(
-                    "\n{prefix}public {static}{name} ({sig}): {type};\n".format(
-                        prefix=prefix,
-                        static=static_str,
-                        name=slot["name"],
-                        sig=sig,
-                        type=type_str,
-                    )
-                )
-    for signal in cls.get("signals", []):
-        if signal["name"] not in used_names:
-            used_names.append(signal["name"])
-        prefix = ""
-        if signal["name"] in RESERVED_WORDS:
-            prefix = "// /* Invalid - Reserved word */"
-        # sig = ",".join(["{}: {}".format(s['name'], build_type(s)) for s in slot['params']])
-        # type_str = build_type(signal)
-        write_jsdoc(f, signal)
+            emit(f"\n{prefix}public {static_str}{name} ({sig}): {type_str};\n")
+    for signal in cls.signals:
+        name = signal.name
+        used_names.add(name)
+        prefix = RESERVED_PREFIX if name in RESERVED_WORDS else ""
+        emit_jsdoc(out, signal)
         type_str = build_signal_type(signal)
         if is_module:
-            f.write(
-                "\nconst {name}: {type};\n".format(name=signal["name"], type=type_str)
-            )
+            emit(f"\nconst {name}: {type_str};\n")
         else:
-            f.write(
-                "\n{prefix}public {name}: {type};\n".format(
-                    prefix=prefix, name=signal["name"], type=type_str
-                )
-            )
-    for prop in cls.get("props", []):
+            emit(f"\n{prefix}public {name}: {type_str};\n")
+    for prop in cls.props:
+        name = prop.name
         prefix = ""
-        if prop["name"] in RESERVED_WORDS:
-            prefix = "// /* Invalid - Reserved word */"
-        elif prop["name"] in used_names:
-            prefix = "// /* Invalid - Duplicate property name */ "
-        elif prop["name"] not in used_names:
-            used_names.append(prop["name"])
-        write_jsdoc(f, prop)
+        if name in RESERVED_WORDS:
+            prefix = RESERVED_PREFIX
+        elif name in used_names:
+            prefix = DUPLICATE_PREFIX
+        else:
+            used_names.add(name)
+        emit_jsdoc(out, prop)
         type_str = build_type(prop)
-        is_static = prop.get("is_static", False)
         if is_module:
-            f.write(
-                "\n{prefix}var {name}: {type};\n".format(
-                    prefix=prefix, name=prop["name"], type=type_str
-                )
-            )
+            emit(f"\n{prefix}var {name}: {type_str};\n")
         else:
-            f.write(
-                "\n{prefix}{static}{name}: {type};\n".format(
-                    prefix=prefix,
-                    static="static " if is_static else "",
-                    name=prop["name"],
-                    type=type_str,
-                )
-            )
+            static = "static " if prop.is_static else ""
+            emit(f"\n{prefix}{static}{name}: {type_str};\n")
     if has_namespace:
-        f.write("\n}")
-    f.write("\n}\n\n")
+        emit("\n}")
+    emit("\n}\n\n")
+    return "".join(out)
+
+
+def render_class(cls: ClassInfo) -> str:
+    """
+    The declarations for one class, as a single string.
+    """
+    return render_class_header(cls) + render_class_body(cls)
+
+
+def write_ts_from_class(cls: ClassInfo, f: typing.TextIO):
+    f.write(render_class(cls))
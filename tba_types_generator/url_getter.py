@@ -1,33 +1,375 @@
+import contextlib
+import contextvars
+import http.client
 import logging
 import os
-import urllib.error
-import urllib.request
+import random
+import socket
+import threading
+import time
+import typing
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from .page_store import PageEntry, get_store, read_legacy_page
 
 logger = logging.getLogger(__name__)
 
-cache_dir = os.path.realpath("./doc-parser-cache")
-if not os.path.isdir(cache_dir):
-    os.mkdir(cache_dir)
+MAX_WORKERS = int(os.environ.get("TBA_TYPES_FETCH_WORKERS", 8))
+MAX_REDIRECTS = 5
+READ_CHUNK_SIZE = 64 * 1024
+# Seconds one request may take as a whole (connecting, sending it and reading
+# the full response) before it fails and is retried.
+REQUEST_TIMEOUT = float(os.environ.get("TBA_TYPES_FETCH_TIMEOUT", 30))
+MAX_RETRIES = int(os.environ.get("TBA_TYPES_FETCH_RETRIES", 4))
+# Requests per second across all workers; 0 disables throttling.
+RATE_LIMIT = float(os.environ.get("TBA_TYPES_FETCH_RATE", 20))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Statuses that are remembered like pages, so missing docs aren't re-requested every run.
+NEGATIVE_CACHE_STATUSES = (404, 410)
+
+# Urls revalidated in the current fetch_scope(); these are never re-checked,
+# whatever the TTL.  Outside of any scope, _validated_urls lasts as long as
+# the process.
+_validated_urls: typing.Set[str] = set()
+_scope_validated_urls: contextvars.ContextVar[typing.Optional[typing.Set[str]]] = contextvars.ContextVar(
+    "scope_validated_urls", default=None
+)
+# Sets collecting every url requested while they are active (see record_urls).
+_recorders: contextvars.ContextVar[typing.Tuple[typing.Set[str], ...]] = contextvars.ContextVar(
+    "recorders", default=()
+)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: allows bursts of up to `capacity` requests,
+    then `rate` requests per second.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # Reserve a token even if it isn't there yet, then wait outside the lock.
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+_rate_limiter = TokenBucket(RATE_LIMIT, capacity=MAX_WORKERS)
+
+
+class ConnectionPool:
+    """
+    Idle keep-alive connections per (scheme, host), shared by every thread:
+    a request takes one (or opens a new one) and puts it back once the
+    response is read, so connections outlive the thread pools using them.
+    At most `max_idle` connections per host are kept.
+    """
+
+    def __init__(self, max_idle: int):
+        self.max_idle = max_idle
+        self._idle: typing.Dict[typing.Tuple[str, str], typing.List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, scheme: str, netloc: str, fresh: bool = False) -> http.client.HTTPConnection:
+        if not fresh:
+            with self._lock:
+                idle = self._idle.get((scheme, netloc))
+                if idle:
+                    return idle.pop()
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=REQUEST_TIMEOUT)
+        return http.client.HTTPConnection(netloc, timeout=REQUEST_TIMEOUT)
+
+    def put(self, scheme: str, netloc: str, conn: http.client.HTTPConnection):
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            conns = [conn for idle in self._idle.values() for conn in idle]
+            self._idle.clear()
+        for conn in conns:
+            conn.close()
+
+
+_pool = ConnectionPool(max_idle=MAX_WORKERS)
+
+
+def _time_left(url: str, deadline: float) -> float:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError(f"Request for {url} took longer than {REQUEST_TIMEOUT}s")
+    return remaining
+
+
+def _read_body(url: str, response: http.client.HTTPResponse, sock: socket.socket, deadline: float) -> bytes:
+    # The socket timeout only limits each read, so a server trickling bytes
+    # could hold a worker forever; give every read what is left instead.
+    chunks = []
+    while True:
+        sock.settimeout(_time_left(url, deadline))
+        chunk = response.read1(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    body = b"".join(chunks)
+    if response.length:
+        raise http.client.IncompleteRead(body, response.length)
+    # read1() leaves a complete response open; read() closes it, so the
+    # connection can send the next request.
+    response.read()
+    return body
+
+
+def _request(url: str, headers: typing.Dict[str, str]):
+    parts = urllib.parse.urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    headers = dict(headers, Connection="keep-alive")
+    deadline = time.monotonic() + REQUEST_TIMEOUT
+    # A pooled connection may have been closed by the server while idle;
+    # retry once on a fresh connection (within the same deadline) before
+    # giving up.
+    for attempt in range(2):
+        conn = _pool.take(parts.scheme, parts.netloc, fresh=attempt > 0)
+        try:
+            conn.timeout = _time_left(url, deadline)
+            if conn.sock is not None:
+                conn.sock.settimeout(conn.timeout)
+            conn.request("GET", path, headers=headers)
+            # Kept, as the connection drops it if the response closes it.
+            sock = conn.sock
+            response = conn.getresponse()
+            body = _read_body(url, response, sock, deadline)
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if attempt:
+                raise
+            continue
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            _pool.put(parts.scheme, parts.netloc, conn)
+        return response.status, response.headers, body
+    raise AssertionError("unreachable")
+
+
+def _backoff_delay(attempt: int) -> float:
+    # "Full jitter" exponential backoff.
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+
+def _retry_after(response_headers) -> typing.Optional[float]:
+    value = response_headers.get("Retry-After")
+    if value and value.isdigit():
+        return min(BACKOFF_MAX, float(value))
+    return None
+
+
+def _request_with_retries(url: str, headers: typing.Dict[str, str]):
+    for attempt in range(MAX_RETRIES + 1):
+        _rate_limiter.acquire()
+        try:
+            status, response_headers, body = _request(url, headers)
+        except (http.client.HTTPException, OSError) as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = _backoff_delay(attempt)
+            logger.warning(f"Request for {url} failed ({e!r}); retrying in {delay:.1f}s")
+        else:
+            if status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                return status, response_headers, body
+            delay = _retry_after(response_headers) or _backoff_delay(attempt)
+            logger.warning(f"Got {status} for {url}; retrying in {delay:.1f}s")
+        time.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+def _fetch(url: str, headers: typing.Dict[str, str]):
+    for _ in range(MAX_REDIRECTS):
+        status, response_headers, body = _request_with_retries(url, headers)
+        location = response_headers.get("Location")
+        if status in (301, 302, 303, 307, 308) and location:
+            url = urllib.parse.urljoin(url, location)
+            continue
+        return status, response_headers, body
+    return status, response_headers, body
+
+
+def _get_cache_ttl() -> typing.Optional[float]:
+    ttl = os.environ.get("TBA_TYPES_CACHE_TTL")
+    if not ttl:
+        return None
+    return float(ttl)
+
+
+def _validated() -> typing.Set[str]:
+    urls = _scope_validated_urls.get()
+    return _validated_urls if urls is None else urls
+
+
+def _is_fresh(url: str, fetched_at: float) -> bool:
+    ttl = _get_cache_ttl()
+    if ttl is None or url in _validated():
+        return True
+    return time.time() - fetched_at < ttl
+
+
+@contextlib.contextmanager
+def fetch_scope() -> typing.Iterator[None]:
+    """
+    Revalidate each page at most once within this block, as the cache TTL
+    asks, e.g. once per build in a long-lived process.  A scope opened
+    inside another one (in the same context) is part of the outer one.
+    """
+    if _scope_validated_urls.get() is not None:
+        yield
+        return
+    token = _scope_validated_urls.set(set())
+    try:
+        yield
+    finally:
+        _scope_validated_urls.reset(token)
+
+
+@contextlib.contextmanager
+def record_urls() -> typing.Iterator[typing.Set[str]]:
+    """
+    Collect the urls read through get_url while active, e.g. to know which
+    pages a build depended on.  Only reads in this context count (this
+    thread, or pool threads running bind_context() functions), so
+    concurrent builds each see their own; nested recorders each see every
+    url.
+    """
+    urls: typing.Set[str] = set()
+    token = _recorders.set(_recorders.get() + (urls,))
+    try:
+        yield urls
+    finally:
+        _recorders.reset(token)
+
+
+def bind_context(fn: typing.Callable) -> typing.Callable:
+    """
+    Wrap `fn` so that it runs in the caller's fetch_scope() and
+    record_urls() from whatever thread calls it (e.g. a ThreadPoolExecutor).
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+def get_page_digest(url: str) -> typing.Optional[str]:
+    """
+    An identifier for what get_url(url) would return now, revalidating the
+    page only if get_url would.  None if the page isn't cached.
+    """
+    store = get_store()
+    digest = store.get_digest(url)
+    if digest is not None and not _is_fresh(url, digest[2]):
+        get_url(url)
+        digest = store.get_digest(url)
+    if digest is None:
+        return None
+    content, status, _ = digest
+    return content if status == 200 else f"status:{status}"
 
 
 def get_url(url: str):
-    a = url.split("/")
-    cache_name = "_".join(a[-5:])
-    old_cache_filename = cache_filename = os.path.join(
-        cache_dir, "{}.html".format(cache_name)
-    )
-    if os.path.isfile(old_cache_filename):
-        cache_filename = old_cache_filename
-    else:
-        cache_filename = os.path.join(cache_dir, cache_name)
-    if os.path.isfile(cache_filename):
-        with open(cache_filename, "r") as f:
-            return f.read()
+    for urls in _recorders.get():
+        urls.add(url)
+    store = get_store()
+    entry = store.get(url)
+    if entry is None and (legacy := read_legacy_page(url)) is not None:
+        html, mtime = legacy
+        store.put(url, html, fetched_at=mtime)
+        entry = PageEntry(html, 200, None, None, mtime)
+    if entry is not None and _is_fresh(url, entry.fetched_at):
+        return entry.body if entry.status == 200 else None
+
+    headers = {}
+    if entry is not None and entry.status == 200:
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
     logger.debug("Requesting: {}".format(url))
-    try:
-        html = urllib.request.urlopen(url).read().decode()
-    except urllib.error.HTTPError:
+    status, response_headers, body = _fetch(url, headers)
+    if status == 304 and entry is not None:
+        store.touch(url)
+        _validated().add(url)
+        return entry.body
+    if status == 200:
+        html = body.decode()
+        store.put(
+            url,
+            html,
+            etag=response_headers.get("ETag"),
+            last_modified=response_headers.get("Last-Modified"),
+        )
+        _validated().add(url)
+        return html
+    if status in NEGATIVE_CACHE_STATUSES:
+        store.put(url, "", status=status)
+        _validated().add(url)
         return None
-    with open(cache_filename, "w") as f:
-        f.write(html)
-    return html
+    if entry is not None and entry.status == 200:
+        logger.warning(f"Got {status} for {url}; using the stale cached copy")
+        return entry.body
+    logger.error(f"Got {status} for {url}; giving up")
+    return None
+
+
+def _prefetch(url: str):
+    try:
+        get_url(url)
+    except Exception as e:
+        # Only a warm-up: the caller's own get_url reports the failure.
+        logger.debug(f"Prefetching {url} failed: {e!r}")
+
+
+def prefetch_urls(urls: typing.Iterable[str], max_workers: int = MAX_WORKERS):
+    """
+    Warm the cache for many urls at once using a bounded pool of workers.
+    Callers still read pages through get_url, in whatever order they need;
+    a page that can't be fetched here is simply left to that call.
+    """
+    store = get_store()
+    pending = []
+    for url in dict.fromkeys(urls):
+        fetched_at = store.get_fetched_at(url)
+        if fetched_at is None or not _is_fresh(url, fetched_at):
+            pending.append(url)
+    if not pending:
+        return
+    logger.debug(f"Prefetching {len(pending)} urls with {max_workers} workers")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for _ in executor.map(bind_context(_prefetch), pending):
+            pass
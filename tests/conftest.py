@@ -0,0 +1,102 @@
+import http.server
+import threading
+import time
+import typing
+
+import pytest
+
+from tba_types_generator import page_store, url_getter
+
+
+class Response(typing.NamedTuple):
+    status: int = 200
+    body: str = ""
+    headers: typing.Dict[str, str] = {}
+    # Seconds to stall before answering.
+    delay: float = 0.0
+    # Seconds to stall before each byte of the body.
+    trickle: float = 0.0
+
+
+class FakeServer:
+    """
+    A local stand-in for docs.toonboom.com.  `routes` maps a path to the
+    responses to give in turn (the last one repeats); other paths are 404s.
+    Every request is logged with its arrival time and client port, which
+    tells connections apart.
+    """
+
+    def __init__(self):
+        self.routes: typing.Dict[str, typing.List[Response]] = {}
+        self.log: typing.List[typing.Tuple[str, float, int]] = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with server._lock:
+                    server.log.append((self.path, time.monotonic(), self.client_address[1]))
+                    responses = server.routes.get(self.path) or [Response(404)]
+                    response = responses.pop(0) if len(responses) > 1 else responses[0]
+                if response.delay:
+                    time.sleep(response.delay)
+                body = response.body.encode()
+                try:
+                    self.send_response(response.status)
+                    for key, value in response.headers.items():
+                        self.send_header(key, value)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    if response.trickle:
+                        for i in range(len(body)):
+                            time.sleep(response.trickle)
+                            self.wfile.write(body[i : i + 1])
+                    else:
+                        self.wfile.write(body)
+                except OSError:
+                    pass  # The client gave up (timeout).
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}{path}"
+
+    def requests(self, path: str) -> typing.List[float]:
+        """Arrival times of the requests for `path`."""
+        return [t for p, t, _ in self.log if p == path]
+
+
+@pytest.fixture
+def server():
+    fake = FakeServer()
+    fake.thread.start()
+    yield fake
+    fake.httpd.shutdown()
+    fake.httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    """
+    A fresh page store (and url_getter state) in a temporary directory, so
+    tests never touch the real cache.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("TBA_TYPES_CACHE_PATH", str(tmp_path / "cache.sqlite"))
+    monkeypatch.delenv("TBA_TYPES_CACHE_TTL", raising=False)
+    monkeypatch.setattr(page_store, "_store", None)
+    monkeypatch.setattr(url_getter, "_validated_urls", set())
+    monkeypatch.setattr(url_getter, "_pool", url_getter.ConnectionPool(max_idle=url_getter.MAX_WORKERS))
+    monkeypatch.setattr(url_getter, "_rate_limiter", url_getter.TokenBucket(0, 1))
+    monkeypatch.setattr(url_getter, "BACKOFF_BASE", 0.01)
+    yield
+    url_getter._pool.close()
+    if page_store._store is not None:
+        page_store._store.close()
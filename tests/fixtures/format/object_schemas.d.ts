@@ -0,0 +1,94 @@
+/**
+ * Script manager.
+ */
+declare class ScriptManager extends QObject {
+  /**
+   * Adds a menu item.
+   * @param {Object} arg
+   */
+  public addMenuItem(arg: {
+    /**
+     * The action uniqueId. Is is recommended to use reverse DNS notation.
+     */
+    id?: string;
+    /**
+     * The action label.
+     */
+    text?: string;
+    /**
+     * The action id if the action was added using ScriptManager.addAction or the name of a function in the current file or using the syntax: functionName in file.js.
+     */
+    action?: string;
+    targetMenuId?: string;
+  }): void;
+
+  /**
+   * Adds a node.
+   * @param {QString} parentGroup The parent group.
+   * @param {int} [x=0]
+   * @param {QScriptValue} [opts={}] Options.
+   * @returns {QString}
+   */
+  public add(
+    parentGroup: QString,
+    x?: int,
+    opts?: {
+      /**
+       * The name (required)
+       */
+      name: string;
+      /**
+       * How many
+       */
+      count?: int;
+    }
+  ): QString;
+
+  /**
+   * Node info.
+   * @returns {Object}
+   */
+  public info(): {
+    /**
+     * The path
+     */
+    path: string;
+    /**
+     * Child paths
+     */
+    children: string[];
+  };
+}
+
+/**
+ * The log.
+ */
+declare namespace MessageLog {
+  /**
+   * Formats.
+   * @param {Object} parts
+   * @returns {string}
+   */
+  function format(parts: {
+    /**
+     * Text
+     */
+    text?: string;
+    level?: int;
+  }): string;
+}
+
+/**
+ * Options.
+ */
+declare interface Opts {
+  /**
+   * the a
+   */
+  a: string[];
+  /**
+   * b
+   */
+  b: number;
+  c: { [key: string]: number };
+}
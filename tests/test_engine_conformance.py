@@ -0,0 +1,39 @@
+from pathlib import Path
+
+import pytest
+
+from tba_types_generator.parser.compare_engines import (
+    ENGINES,
+    check_conformance,
+    first_difference,
+    is_class_page,
+    reference_backend,
+)
+
+PAGES = sorted((Path(__file__).parent / "fixtures" / "pages").glob("*.html"))
+
+
+@pytest.mark.parametrize("path", PAGES, ids=[p.name for p in PAGES])
+def test_engines_agree(path):
+    html = path.read_text(encoding="utf-8")
+    assert is_class_page(html)
+    with reference_backend():
+        expected = ENGINES["bs4"](html)
+        actual = ENGINES["stream"](html)
+    assert first_difference(expected, actual) is None
+    assert actual == expected
+
+
+def test_check_conformance_reports_nothing():
+    pages = [(path.name, path.read_text(encoding="utf-8")) for path in PAGES]
+    assert check_conformance(pages) == []
+
+
+def test_check_conformance_reports_differences(monkeypatch):
+    def broken(html):
+        return {**ENGINES["bs4"](html), "name": "other"}
+
+    html = PAGES[0].read_text(encoding="utf-8")
+    monkeypatch.setitem(ENGINES, "stream", broken)
+    [(url, diff)] = check_conformance([("page.html", html)])
+    assert url == "page.html" and diff.startswith("/name:")
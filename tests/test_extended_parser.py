@@ -0,0 +1,38 @@
+from pathlib import Path
+
+import pytest
+
+from tba_types_generator.parser.tba_extended_parser import _parse_class
+
+FOO_PAGE = Path(__file__).parent / "fixtures" / "extended" / "Foo.html"
+
+
+def _slot(class_data, name):
+    return next(slot for slot in class_data["slots"] if slot["name"] == name)
+
+
+def test_parse_class():
+    foo = _parse_class(FOO_PAGE.read_text(encoding="utf-8"))
+    assert foo["name"] == "Foo"
+    bar = _slot(foo, "bar")
+    assert bar["keyword"] == "static"
+    assert bar["type"] == "string"
+    assert [(p["name"], p["type"]) for p in bar["params"]] == [("a", "number[][]"), ("opts", "Object")]
+
+
+@pytest.mark.parametrize(
+    "jsdoc, expected",
+    [
+        ("Array.&lt;Float32Array&gt;", "Float32Array[]"),
+        ("Promise.&lt;Array.&lt;Node&gt;&gt;", "Promise<Node[]>"),
+        ("Map.&lt;string, Object&gt;", "Map<string, Object>"),
+        ("Object.&lt;string, Array.&lt;number&gt;&gt;", "{[key: string] : number[]}"),
+    ],
+)
+def test_generic_return_types(jsdoc, expected):
+    html = FOO_PAGE.read_text(encoding="utf-8")
+    html = html.replace(
+        '<dd><span class="param-type">string</span></dd>',
+        f'<dd><span class="param-type">{jsdoc}</span></dd>',
+    )
+    assert _slot(_parse_class(html), "bar")["type"] == expected
@@ -0,0 +1,106 @@
+import time
+
+import pytest
+from conftest import Response
+
+from tba_types_generator import url_getter
+
+
+def test_retries_transient_errors(server):
+    server.routes["/a.html"] = [Response(503), Response(502), Response(body="a")]
+    assert url_getter.get_url(server.url("/a.html")) == "a"
+    assert len(server.requests("/a.html")) == 3
+
+
+def test_gives_up_after_max_retries(server, monkeypatch):
+    monkeypatch.setattr(url_getter, "MAX_RETRIES", 2)
+    server.routes["/a.html"] = [Response(500)]
+    assert url_getter.get_url(server.url("/a.html")) is None
+    assert len(server.requests("/a.html")) == 3
+    # Not cached: the next run tries again.
+    assert url_getter.get_url(server.url("/a.html")) is None
+    assert len(server.requests("/a.html")) == 6
+
+
+def test_does_not_retry_other_statuses(server):
+    server.routes["/a.html"] = [Response(404)]
+    assert url_getter.get_url(server.url("/a.html")) is None
+    assert len(server.requests("/a.html")) == 1
+
+
+def test_backoff_grows_exponentially(server, monkeypatch):
+    # Always the top of the jitter range.
+    monkeypatch.setattr(url_getter.random, "uniform", lambda low, high: high)
+    monkeypatch.setattr(url_getter, "BACKOFF_BASE", 0.05)
+    server.routes["/a.html"] = [Response(503)] * 3 + [Response(body="a")]
+    url_getter.get_url(server.url("/a.html"))
+    times = server.requests("/a.html")
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    for gap, expected in zip(gaps, [0.05, 0.1, 0.2]):
+        assert expected <= gap < expected + 0.15
+
+
+def test_backoff_is_jittered_and_capped(monkeypatch):
+    monkeypatch.setattr(url_getter, "BACKOFF_MAX", 1.0)
+    delays = [url_getter._backoff_delay(10) for _ in range(200)]
+    assert all(0 <= d <= 1.0 for d in delays)
+    assert len(set(delays)) > 1
+
+
+def test_honours_retry_after(server, monkeypatch):
+    monkeypatch.setattr(url_getter, "BACKOFF_MAX", 0.3)
+    server.routes["/a.html"] = [Response(429, headers={"Retry-After": "5"}), Response(body="a")]
+    assert url_getter.get_url(server.url("/a.html")) == "a"
+    first, second = server.requests("/a.html")
+    # Capped at BACKOFF_MAX.
+    assert 0.3 <= second - first < 1.0
+
+
+def test_stalled_request_times_out_and_retries(server, monkeypatch):
+    monkeypatch.setattr(url_getter, "REQUEST_TIMEOUT", 0.2)
+    server.routes["/a.html"] = [Response(body="late", delay=2), Response(body="a")]
+    start = time.monotonic()
+    assert url_getter.get_url(server.url("/a.html")) == "a"
+    assert time.monotonic() - start < 1.5
+    assert len(server.requests("/a.html")) == 2
+
+
+def test_timeout_fires_when_server_keeps_stalling(server, monkeypatch):
+    monkeypatch.setattr(url_getter, "REQUEST_TIMEOUT", 0.2)
+    monkeypatch.setattr(url_getter, "MAX_RETRIES", 1)
+    server.routes["/a.html"] = [Response(body="late", delay=2)]
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        url_getter.get_url(server.url("/a.html"))
+    assert time.monotonic() - start < 1.5
+    assert len(server.requests("/a.html")) == 2
+
+
+def test_timeout_covers_the_whole_response(server, monkeypatch):
+    monkeypatch.setattr(url_getter, "REQUEST_TIMEOUT", 0.3)
+    # Every byte arrives well within the timeout, the whole body doesn't.
+    server.routes["/a.html"] = [Response(body="x" * 40, trickle=0.05), Response(body="a")]
+    start = time.monotonic()
+    assert url_getter.get_url(server.url("/a.html")) == "a"
+    assert time.monotonic() - start < 1.5
+    assert len(server.requests("/a.html")) == 2
+
+
+def test_rate_limit_spaces_requests(server, monkeypatch):
+    monkeypatch.setattr(url_getter, "_rate_limiter", url_getter.TokenBucket(rate=20, capacity=2))
+    paths = [f"/{i}.html" for i in range(8)]
+    for path in paths:
+        server.routes[path] = [Response(body="x")]
+    url_getter.prefetch_urls((server.url(path) for path in paths), max_workers=4)
+    times = sorted(t for _, t, _ in server.log)
+    # A burst of `capacity`, then one request every 1/rate seconds.
+    assert times[1] - times[0] < 0.04
+    assert times[-1] - times[0] >= (len(paths) - 2) / 20 * 0.9
+
+
+def test_token_bucket_refills():
+    bucket = url_getter.TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - start >= 5 / 50 * 0.9
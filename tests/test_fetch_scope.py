@@ -0,0 +1,64 @@
+import threading
+
+from conftest import Response
+
+from tba_types_generator import url_getter
+
+
+def test_connections_outlive_thread_pools(server):
+    for i in range(16):
+        server.routes[f"/{i}.html"] = [Response(body="x")]
+    url_getter.prefetch_urls((server.url(f"/{i}.html") for i in range(8)), max_workers=4)
+    first = {port for _, _, port in server.log}
+    url_getter.prefetch_urls((server.url(f"/{i}.html") for i in range(8, 16)), max_workers=4)
+    assert {port for _, _, port in server.log} == first
+
+
+def test_each_scope_revalidates_once(server, monkeypatch):
+    monkeypatch.setenv("TBA_TYPES_CACHE_TTL", "0")
+    server.routes["/a.html"] = [Response(body="a", headers={"ETag": '"1"'}), Response(304)]
+    for _ in range(2):
+        with url_getter.fetch_scope():
+            for _ in range(3):
+                assert url_getter.get_url(server.url("/a.html")) == "a"
+    assert len(server.requests("/a.html")) == 2
+
+
+def test_nested_scopes_share_validation(server, monkeypatch):
+    monkeypatch.setenv("TBA_TYPES_CACHE_TTL", "0")
+    server.routes["/a.html"] = [Response(body="a")]
+    with url_getter.fetch_scope():
+        url_getter.get_url(server.url("/a.html"))
+        with url_getter.fetch_scope():
+            url_getter.get_url(server.url("/a.html"))
+    assert len(server.requests("/a.html")) == 1
+
+
+def test_concurrent_recorders_stay_apart(server):
+    barrier = threading.Barrier(2)
+    recorded = {}
+
+    def build(name):
+        server.routes[f"/{name}.html"] = [Response(body=name)]
+        with url_getter.record_urls() as urls:
+            barrier.wait()
+            url_getter.get_url(server.url(f"/{name}.html"))
+            barrier.wait()
+        recorded[name] = urls
+
+    threads = [threading.Thread(target=build, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert recorded == {name: {server.url(f"/{name}.html")} for name in ("a", "b")}
+
+
+def test_recorders_see_pool_threads(server):
+    urls = [server.url(f"/{i}.html") for i in range(6)]
+    for i in range(6):
+        server.routes[f"/{i}.html"] = [Response(body="x")]
+    with url_getter.record_urls() as outer:
+        with url_getter.record_urls() as inner:
+            url_getter.prefetch_urls(urls, max_workers=3)
+    assert outer == inner == set(urls)
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from tba_types_generator.parser import tba_parser
+from tba_types_generator.parser.tba_parser import _read_js_array_var, _read_js_array_var_esprima
+
+HIERARCHY = [
+    ["QObject", None, [
+        ["node", "classnode.html", None],
+        ["column", "classcolumn.html", [
+            ["Sub", "classSub.html", None],
+        ]],
+    ]],
+    ["GlobalObject", "classGlobalObject.html", [
+        ["MessageLog", "namespaceMessageLog.html", None],
+    ]],
+    ["Unicode é \"quoted\"", "class_u.html", None],
+]
+
+
+def _script(var_name, data, indent=None):
+    return f"var {var_name} =\n{json.dumps(data, indent=indent)};\n"
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_fast_reader_matches_esprima(indent):
+    pytest.importorskip("esprima")
+    js = _script("hierarchy", HIERARCHY, indent)
+    fast = _read_js_array_var(js, "hierarchy")
+    assert fast == _read_js_array_var_esprima(js, "hierarchy")
+    assert fast[0]["members"][1]["members"] == [{"name": "Sub", "url": "classSub.html"}]
+
+
+def test_falls_back_to_esprima_for_non_json():
+    pytest.importorskip("esprima")
+    # Single quotes and a trailing comma: valid JavaScript, not JSON.
+    js = "var namespaces_dup = [ ['a', 'a.html', null], ];"
+    assert _read_js_array_var(js, "namespaces_dup") == [{"name": "a", "url": "a.html"}]
+
+
+def _class(name, members=None, url=None):
+    item = {"name": name, "url": url if url is not None else f"class{name}.html"}
+    if members:
+        item["members"] = members
+    return item
+
+
+CLASS_TREE = [
+    {"name": "QObject", "url": None, "members": [
+        _class("A", [_class("B")]),
+        _class("Missing", [_class("D", [_class("E")])]),
+        _class("Dup", [_class("F")]),
+        _class("Ns::X", [_class("G")], url="classNs_1_1X.html"),
+        _class("C"),
+    ]},
+    _class("H"),
+]  # fmt: skip
+# url -> the class name its page declares (the fake parser's result).
+CLASS_PAGES = {
+    **{f"class{name}.html": name for name in "ABCDEFGH"},
+    "classMissing.html": None,
+    "classDup.html": "A",
+    "classNs_1_1X.html": "Ns::X",
+}
+BASE_URL = "https://docs.toonboom.com/help/storyboard-pro-22/storyboard/scripting/reference"
+
+
+@pytest.fixture
+def class_pages(monkeypatch):
+    monkeypatch.setattr(tba_parser, "get_class_hierarchy", lambda url: CLASS_TREE)
+    monkeypatch.setattr(tba_parser, "prefetch_urls", lambda urls: None)
+    monkeypatch.setattr(tba_parser, "get_url", lambda url: CLASS_PAGES[url[len(BASE_URL) + 1 :]])
+    monkeypatch.setattr(tba_parser, "parse_class_page_detailed", lambda html: {"name": html})
+    monkeypatch.setattr(tba_parser, "parse_many", lambda parse, htmls, workers: [parse(h) for h in htmls])
+
+
+@pytest.mark.parametrize("parse_workers", [0, 2])
+def test_skipped_classes_drop_their_subclasses(class_pages, parse_workers):
+    # Missing's page is gone, Dup's page is A again and Ns::X is nested:
+    # none of them, nor anything under them, makes it out.
+    classes = tba_parser.iter_class_htmls("sbpro", 22, parse_workers=parse_workers)
+    assert [(c["name"], c["parent"]) for c in classes] == [
+        ("A", "QObject"),
+        ("B", "A"),
+        ("C", "QObject"),
+        ("H", None),
+    ]
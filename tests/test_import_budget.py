@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ["bs4", "esprima", "jsbeautifier", "json5"]
+# Seconds; the imports take a few tens of milliseconds, the rest is slack
+# for slow CI machines.
+IMPORT_BUDGET = 0.5
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "modules": sorted(sys.modules)}}))
+"""
+
+
+@pytest.mark.parametrize("module", ["tba_types_generator", "tba_types_generator.session", "generate"])
+def test_import_is_cheap(module, tmp_path):
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT))
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module)],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    probe = json.loads(result.stdout)
+    assert not set(HEAVY_MODULES) & set(probe["modules"])
+    # No cache directory or database created relative to the cwd.
+    assert list(tmp_path.iterdir()) == []
+    assert probe["seconds"] < IMPORT_BUDGET
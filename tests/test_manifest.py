@@ -0,0 +1,92 @@
+import pytest
+
+from tba_types_generator import _write_files
+from tba_types_generator.manifest import file_hash, is_up_to_date
+from tba_types_generator.page_store import content_hash, get_store
+
+URL = "https://docs.toonboom.com/help/harmony-22/scripting/script/classnode.html"
+INPUTS = {"code": "c1", "overrides": "o1", "preambles": "p1"}
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    get_store().put(URL, "<p>node</p>")
+    path = tmp_path / "index.d.ts"
+    path.write_text("declare class node {}\n")
+    return {
+        **INPUTS,
+        "pages": {URL: content_hash("<p>node</p>")},
+        "files": {str(path): {"rendered": "r", "output": file_hash(path)}},
+    }
+
+
+def test_up_to_date(manifest):
+    assert is_up_to_date(manifest, INPUTS)
+
+
+def test_no_manifest():
+    assert not is_up_to_date(None, INPUTS)
+
+
+@pytest.mark.parametrize("key", list(INPUTS))
+def test_changed_input(manifest, key):
+    assert not is_up_to_date(manifest, {**INPUTS, key: "other"})
+
+
+def test_edited_output(manifest):
+    [path] = manifest["files"]
+    with open(path, "a") as f:
+        f.write("// edited\n")
+    assert not is_up_to_date(manifest, INPUTS)
+
+
+def test_missing_output(manifest, tmp_path):
+    (tmp_path / "index.d.ts").unlink()
+    assert not is_up_to_date(manifest, INPUTS)
+
+
+def test_changed_page(manifest):
+    get_store().put(URL, "<p>node, changed</p>")
+    assert not is_up_to_date(manifest, INPUTS)
+
+
+def test_page_no_longer_cached(manifest):
+    manifest["pages"]["https://docs.toonboom.com/help/harmony-22/missing.html"] = "x"
+    assert not is_up_to_date(manifest, INPUTS)
+
+
+def _previous(rendered):
+    return {path: {"rendered": digest, "output": file_hash(path)} for path, digest in rendered.items()}
+
+
+def test_write_files_skips_unchanged(tmp_path):
+    files = {str(tmp_path / "a.d.ts"): "a", str(tmp_path / "b.d.ts"): "b"}
+    rendered = {}
+    assert sorted(_write_files(files, None, rendered)) == sorted(files)
+    assert rendered == {path: content_hash(text) for path, text in files.items()}
+
+    previous = _previous(rendered)
+    assert _write_files(files, previous, {}) == []
+    changed = {**files, str(tmp_path / "b.d.ts"): "b2"}
+    assert _write_files(changed, previous, {}) == [str(tmp_path / "b.d.ts")]
+
+
+def test_write_files_rewrites_edited_files(tmp_path):
+    files = {str(tmp_path / "a.d.ts"): "a"}
+    rendered = {}
+    _write_files(files, None, rendered)
+    previous = _previous(rendered)
+    (tmp_path / "a.d.ts").write_text("edited")
+    assert _write_files(files, previous, {}) == [str(tmp_path / "a.d.ts")]
+    assert (tmp_path / "a.d.ts").read_text() == "a"
+
+
+def test_write_files_compares_formatted_output(tmp_path):
+    # The manifest holds the hash of the file after formatting.
+    files = {str(tmp_path / "a.d.ts"): "a"}
+    rendered = {}
+    _write_files(files, None, rendered)
+    (tmp_path / "a.d.ts").write_text("a (formatted)")
+    previous = _previous(rendered)
+    assert _write_files(files, previous, {}) == []
+    assert (tmp_path / "a.d.ts").read_text() == "a (formatted)"
@@ -0,0 +1,154 @@
+import os
+
+import pytest
+
+from tba_types_generator.model import ClassInfo
+from tba_types_generator.overrides import Overrides, compile_overrides, load_overrides
+from tba_types_generator.page_store import get_store
+
+
+def _class(name="node", **fields):
+    data = {
+        "name": name,
+        "parent": "QObject",
+        "slots": [
+            {
+                "name": "add",
+                "type": "QString",
+                "params": [
+                    {"name": "parentGroup", "type": "QString"},
+                    {"name": "x", "type": "int"},
+                ],
+            },
+            {"name": "type", "type": "QString"},
+        ],
+        "props": [{"name": "enabled", "type": "bool"}],
+    }
+    data.update(fields)
+    return ClassInfo.from_dict(data)
+
+
+def _apply(override_data, cls):
+    return Overrides(compile_overrides(override_data)).apply(cls)
+
+
+def _slot(cls, name):
+    return next(slot for slot in cls.slots if slot.name == name)
+
+
+def _params(slot):
+    return [(p.name, p.type, p.desc) for p in slot.params]
+
+
+def test_skip():
+    assert not _apply({"classes": {"node": {"skip": True}}}, _class())
+    assert _apply({"classes": {"column": {"skip": True}}}, _class())
+
+
+def test_add_slots_and_props():
+    cls = _class()
+    added_slot = {"name": "extra", "type": "int", "params": [{"name": "a", "type": "int"}]}
+    added_prop = {"name": "count", "type": "int"}
+    _apply({"classes": {"node": {"add_slots": [added_slot], "add_props": [added_prop]}}}, cls)
+    assert [s.name for s in cls.slots] == ["add", "type", "extra"]
+    assert _params(cls.slots[-1]) == [("a", "int", None)]
+    assert [p.name for p in cls.props] == ["enabled", "count"]
+
+
+def test_add_props_to_class_without_props():
+    cls = _class(props=[])
+    _apply({"classes": {"node": {"add_props": [{"name": "count", "type": "int"}]}}}, cls)
+    assert [p.name for p in cls.props] == ["count"]
+
+
+def test_set_and_remove_class_keys():
+    cls = _class()
+    _apply({"classes": {"node": {"parent": None, "is_namespace": True}}}, cls)
+    assert cls.parent is None
+    assert cls.is_namespace
+
+
+def test_added_members_are_not_shared():
+    override_data = {"classes": {"node": {"add_slots": [{"name": "extra", "params": [{"name": "a"}]}]}}}
+    overrides = Overrides(compile_overrides(override_data))
+    first, second = _class(), _class()
+    overrides.apply(first)
+    overrides.apply(second)
+    first.slots[-1].params[0].type = "changed"
+    assert second.slots[-1].params[0].type == ""
+    assert override_data["classes"]["node"]["add_slots"][0]["params"][0] == {"name": "a"}
+
+
+def test_set_slot_keys():
+    cls = _class()
+    _apply({"slots": {"add": {"type": "string", "note": "n", "invalid": True}}}, cls)
+    add = _slot(cls, "add")
+    assert (add.type, add.note, add.invalid) == ("string", "n", True)
+    assert _slot(cls, "type").type == "QString"
+
+
+@pytest.mark.parametrize(
+    "class_name, applies",
+    [("node", True), ("column", False), (None, False)],
+)
+def test_slot_class_name(class_name, applies):
+    # Any class_name given, even null, limits the override to that class.
+    cls = _class()
+    _apply({"slots": {"type": {"class_name": class_name, "type": "string"}}}, cls)
+    assert (_slot(cls, "type").type == "string") == applies
+
+
+def test_slot_without_class_name_applies_everywhere():
+    for name in ("node", "column"):
+        cls = _class(name)
+        _apply({"slots": {"type": {"type": "string"}}}, cls)
+        assert _slot(cls, "type").type == "string"
+
+
+def test_patch_params():
+    cls = _class()
+    override_data = {
+        "slots": {
+            "add": {
+                "params": [
+                    {"name": "x", "type": "number", "desc": "first"},
+                    {"name": "x", "type": "string", "desc": "second"},
+                    {"name": "missing", "type": "int"},
+                ]
+            }
+        }
+    }
+    _apply(override_data, cls)
+    # First match wins; params the slot doesn't have are not added.
+    assert _params(_slot(cls, "add")) == [("parentGroup", "QString", None), ("x", "number", "first")]
+
+
+def test_replace_params():
+    cls = _class()
+    override_data = {"slots": {"add": {"replace_params": True, "params": [{"name": "opts", "type": "Object"}]}}}
+    _apply(override_data, cls)
+    assert _params(_slot(cls, "add")) == [("opts", "Object", None)]
+
+
+def test_remove_params():
+    cls = _class()
+    _apply({"slots": {"add": {"replace_params": True, "params": []}}}, cls)
+    assert _slot(cls, "add").params == []
+
+
+def test_directives_are_not_copied():
+    compiled = compile_overrides(
+        {"slots": {"add": {"class_name": "node", "replace_params": True, "params": [], "type": "int"}}}
+    )
+    assert compiled["slots"]["add"]["set"] == {"type": "int"}
+
+
+def test_edits_replace_the_stored_compilation(tmp_path):
+    path = tmp_path / "override.jsonc"
+    for i, text in enumerate(["{}", "{classes: {Foo: {skip: true}}}", "{classes: {Bar: {skip: true}}}"]):
+        path.write_text(text)
+        os.utime(path, ns=(i * 1_000_000_000, i * 1_000_000_000))
+        overrides = load_overrides(str(path))
+    assert overrides.skip == {"Bar"}
+    keys = [key for (key,) in get_store()._conn.execute("SELECT key FROM memos") if key.startswith("overrides:")]
+    assert len(keys) == 1
@@ -0,0 +1,53 @@
+import time
+
+from tba_types_generator.page_store import PageStore
+
+
+def test_round_trip_and_dedup(tmp_path):
+    store = PageStore(str(tmp_path / "pages.sqlite"))
+    store.put("http://x/a.html", "<p>same</p>", etag='"1"')
+    store.put("http://x/b.html", "<p>same</p>")
+    entry = store.get("http://x/a.html")
+    assert (entry.body, entry.status, entry.etag) == ("<p>same</p>", 200, '"1"')
+    assert store.get("http://x/missing.html") is None
+    (blobs,) = store._conn.execute("SELECT COUNT(*) FROM blobs").fetchone()
+    assert blobs == 1
+    store.close()
+
+
+def test_reads_do_not_write_without_eviction(tmp_path):
+    store = PageStore(str(tmp_path / "pages.sqlite"))
+    store.put("http://x/a.html", "a")
+    changes = store._conn.total_changes
+    for _ in range(10):
+        store.get("http://x/a.html")
+    assert store._conn.total_changes == changes
+    store.close()
+
+
+def test_reads_are_batched_with_eviction(tmp_path):
+    store = PageStore(str(tmp_path / "pages.sqlite"), max_bytes=10**9)
+    store.put("http://x/a.html", "a")
+    changes = store._conn.total_changes
+    store.get("http://x/a.html")
+    assert store._conn.total_changes == changes
+    store.flush()
+    assert store._conn.total_changes == changes + 1
+
+
+def test_lru_eviction_follows_reads(tmp_path):
+    path = str(tmp_path / "pages.sqlite")
+    store = PageStore(path)
+    pages = {f"http://x/{i}.html": f"page {i} " * 50 for i in range(3)}
+    for url, body in pages.items():
+        store.put(url, body)
+        time.sleep(0.01)
+    (size,) = store._conn.execute("SELECT MAX(size) FROM blobs").fetchone()
+    store.close()
+    # Room for two pages: reading the oldest one keeps it over the next.
+    store = PageStore(path, max_bytes=2 * size + size // 2)
+    store.get("http://x/0.html")
+    store.put("http://x/3.html", "page 3 " * 50)
+    assert store.get("http://x/0.html") is not None
+    assert store.get("http://x/1.html") is None
+    store.close()
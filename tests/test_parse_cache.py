@@ -0,0 +1,55 @@
+import pytest
+
+from tba_types_generator import parse_cache
+from tba_types_generator.page_store import get_store
+
+
+@pytest.fixture
+def parser(monkeypatch):
+    """
+    A memoized parser that counts its calls, with a parser version the test
+    can change.
+    """
+    monkeypatch.setattr(parse_cache, "_results", {})
+    monkeypatch.setattr(parse_cache, "get_parser_version", lambda: parser.version)
+    parse_cache._prune_stale_results.cache_clear()
+    calls = []
+
+    @parse_cache.memoize_parse
+    def parser(html):
+        calls.append(html)
+        return {"html": html}
+
+    parser.version = "v1"
+    parser.calls = calls
+    yield parser
+    parse_cache._prune_stale_results.cache_clear()
+
+
+def test_results_are_reused_per_parser_version(parser):
+    assert parser("<p>a</p>") == {"html": "<p>a</p>"}
+    assert parser("<p>a</p>") == {"html": "<p>a</p>"}
+    assert len(parser.calls) == 1
+
+    # e.g. another soup backend selected in the same process
+    parser.version = "v2"
+    parser("<p>a</p>")
+    assert len(parser.calls) == 2
+
+    # A new process only has the results on disk.
+    parse_cache._results.clear()
+    parser("<p>a</p>")
+    assert len(parser.calls) == 2
+
+
+def test_stale_parser_versions_are_deleted(parser):
+    store = get_store()
+    store.put_memo("overrides:override.jsonc:3:1:2", "{}")
+    parser("<p>a</p>")
+    parser.version = "v2"
+    parser("<p>a</p>")
+    keys = [key for (key,) in store._conn.execute("SELECT key FROM memos ORDER BY key")]
+    assert keys == [
+        "overrides:override.jsonc:3:1:2",
+        f"parse:v2:{parser.memo_name}:{parse_cache.content_hash('<p>a</p>')}",
+    ]
@@ -0,0 +1,61 @@
+import socket
+
+import pytest
+from conftest import Response
+
+from tba_types_generator import url_getter
+from tba_types_generator.page_store import get_store
+
+
+def _closed_port_url() -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}/gone.html"
+
+
+def test_prefetch_fills_the_cache(server):
+    paths = [f"/class{i}.html" for i in range(20)]
+    for path in paths:
+        server.routes[path] = [Response(body=f"<p>{path}</p>")]
+    url_getter.prefetch_urls(server.url(path) for path in paths)
+    assert sorted(p for p, _, _ in server.log) == sorted(paths)
+    # Later reads come from the cache, in whatever order the caller wants.
+    for path in reversed(paths):
+        assert url_getter.get_url(server.url(path)) == f"<p>{path}</p>"
+    assert len(server.log) == len(paths)
+
+
+def test_prefetch_reuses_connections(server):
+    paths = [f"/class{i}.html" for i in range(80)]
+    for path in paths:
+        server.routes[path] = [Response(body="x")]
+    url_getter.prefetch_urls((server.url(path) for path in paths[:40]), max_workers=4)
+    first = {port for _, _, port in server.log}
+    url_getter.prefetch_urls((server.url(path) for path in paths[40:]), max_workers=4)
+    second = {port for _, _, port in server.log[40:]}
+    # Connections go back to the shared pool, so a new connection is only
+    # opened while all others are busy, and the second prefetch's threads
+    # reuse the first one's connections.
+    assert len(server.log) == 80
+    assert len(first | second) <= 4
+
+
+def test_prefetch_skips_cached_pages(server):
+    server.routes["/a.html"] = [Response(body="a")]
+    url_getter.get_url(server.url("/a.html"))
+    url_getter.prefetch_urls([server.url("/a.html")] * 3)
+    assert len(server.requests("/a.html")) == 1
+
+
+def test_prefetch_survives_failing_pages(server, monkeypatch):
+    monkeypatch.setattr(url_getter, "MAX_RETRIES", 1)
+    server.routes["/ok.html"] = [Response(body="ok")]
+    server.routes["/broken.html"] = [Response(503)]
+    unreachable = _closed_port_url()
+    url_getter.prefetch_urls([server.url("/broken.html"), unreachable, server.url("/ok.html")])
+    assert get_store().get(server.url("/ok.html")).body == "ok"
+    # The failures are left for the real fetch to report.
+    assert url_getter.get_url(server.url("/broken.html")) is None
+    with pytest.raises(OSError):
+        url_getter.get_url(unreachable)
@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+from tba_types_generator import get_target_dir
+from tba_types_generator.page_store import content_hash
+from tba_types_generator.session import GeneratorSession
+
+
+def _write(path, text, mtime_ns):
+    path.write_text(text)
+    # Filesystem timestamps can be coarse; make every edit visible.
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def override_dir(tmp_path):
+    directory = tmp_path / "override"
+    directory.mkdir()
+    _write(directory / "override.jsonc", "{}", 1_000_000_000)
+    _write(directory / "preamble.ts", "// one", 1_000_000_000)
+    return directory
+
+
+def test_preambles_are_reloaded_when_edited(override_dir):
+    session = GeneratorSession(str(override_dir))
+    assert session.extra_ts_files == {"preamble": "// one"}
+    assert session.extra_ts_files is session.extra_ts_files
+    _write(override_dir / "preamble.ts", "// two", 2_000_000_000)
+    assert session.extra_ts_files == {"preamble": "// two"}
+    _write(override_dir / "extra.ts", "// new", 2_000_000_000)
+    assert session.extra_ts_files == {"preamble": "// two", "extra": "// new"}
+    os.remove(override_dir / "extra.ts")
+    assert session.extra_ts_files == {"preamble": "// two"}
+
+
+def test_overrides_are_reloaded_when_edited(override_dir):
+    session = GeneratorSession(str(override_dir))
+    assert session.overrides.skip == frozenset()
+    _write(override_dir / "override.jsonc", '{classes: {Foo: {skip: true}}}', 2_000_000_000)
+    assert session.overrides.skip == {"Foo"}
+
+
+class FakeGenerate:
+    """
+    Stands in for GeneratorSession.generate: writes the skipped classes of
+    the overrides it is given, optionally running `during` first.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.calls = 0
+        self.during = None
+
+    def __call__(self, host, version_num, format_paths, failures, previous_files, rendered, overrides, extra_ts_files):
+        self.calls += 1
+        if self.during:
+            self.during()
+        ts_dir = get_target_dir(host, version_num, self.session.output_dir)
+        ts_dir.mkdir(parents=True, exist_ok=True)
+        path = str(ts_dir / "index.d.ts")
+        text = " ".join(sorted(overrides.skip)) + "\n"
+        with open(path, "w") as f:
+            f.write(text)
+        rendered[path] = content_hash(text)
+        return path
+
+
+@pytest.fixture
+def session(override_dir, tmp_path, monkeypatch):
+    monkeypatch.setenv("TBA_TYPES_FORMATTER", "native")
+    session = GeneratorSession(str(override_dir), tmp_path / "dist")
+    monkeypatch.setattr(session, "generate", FakeGenerate(session))
+    return session
+
+
+def test_override_edits_reach_the_output(session, override_dir):
+    [result] = session.build([("harmony", 22)])
+    assert open(result.path).read() == "\n"
+    [result] = session.build([("harmony", 22)])
+    assert result.up_to_date and session.generate.calls == 1
+
+    _write(override_dir / "override.jsonc", "{classes: {Foo: {skip: true}}}", 2_000_000_000)
+    [result] = session.build([("harmony", 22)])
+    assert not result.up_to_date
+    assert open(result.path).read() == "Foo\n"
+
+
+def test_manifest_describes_the_applied_overrides(session, override_dir):
+    # An edit made while a target builds shows up in the next build.
+    def edit():
+        _write(override_dir / "override.jsonc", "{classes: {Foo: {skip: true}}}", 2_000_000_000)
+
+    session.generate.during = edit
+    session.build([("harmony", 22)])
+    session.generate.during = None
+    [result] = session.build([("harmony", 22)])
+    assert not result.up_to_date
+    assert open(result.path).read() == "Foo\n"
+    [result] = session.build([("harmony", 22)])
+    assert result.up_to_date
+
+
+def test_preamble_edits_are_detected(session, override_dir):
+    session.build([("harmony", 22)])
+    _write(override_dir / "preamble.ts", "// two", 2_000_000_000)
+    [result] = session.build([("harmony", 22)])
+    assert not result.up_to_date
@@ -0,0 +1,26 @@
+import pytest
+
+from tba_types_generator.parse_cache import get_parser_version
+from tba_types_generator.parser.soup import get_backend
+
+
+def test_html_parser_is_the_default(monkeypatch):
+    # Even with lxml installed, so output doesn't depend on the environment.
+    monkeypatch.delenv("TBA_TYPES_HTML_PARSER", raising=False)
+    assert get_backend() == "html.parser"
+
+
+def test_lxml_is_opt_in(monkeypatch):
+    pytest.importorskip("lxml")
+    monkeypatch.delenv("TBA_TYPES_HTML_PARSER", raising=False)
+    default_version = get_parser_version()
+    monkeypatch.setenv("TBA_TYPES_HTML_PARSER", "lxml")
+    assert get_backend() == "lxml"
+    # Parse results are cached per backend.
+    assert get_parser_version() != default_version
+
+
+def test_unknown_backend(monkeypatch):
+    monkeypatch.setenv("TBA_TYPES_HTML_PARSER", "html5lib")
+    with pytest.raises(ValueError):
+        get_backend()
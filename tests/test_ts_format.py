@@ -0,0 +1,148 @@
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from tba_types_generator import _prettier_command
+from tba_types_generator.model import ClassInfo, Member
+from tba_types_generator.ts_format import format_typescript
+from tba_types_generator.typescript_builder import render_class, render_interface
+
+# What prettier (with PRETTIER_OPTIONS) makes of builder_output().
+GOLDEN = Path(__file__).parent / "fixtures" / "format" / "object_schemas.d.ts"
+
+ACTION_SCHEMA = [
+    {"name": "id", "type": "string", "desc": "The action uniqueId. Is is recommended to use reverse DNS notation."},
+    {"name": "text", "type": "string", "desc": "The action label."},
+    {
+        "name": "action",
+        "type": "string",
+        "desc": "The action id if the action was added using ScriptManager.addAction or the name of a function"
+        " in the current file or using the syntax: functionName in file.js.",
+    },
+    {"name": "targetMenuId", "type": "string"},
+]
+
+
+def builder_output() -> str:
+    """
+    Object schemas (doc-commented fields) as the builder writes them: a
+    lone object parameter, one among others, a return type, a namespace
+    function and a global interface.
+    """
+    script_manager = ClassInfo.from_dict(
+        {
+            "name": "ScriptManager",
+            "parent": "QObject",
+            "desc": "Script manager.",
+            "slots": [
+                {
+                    "name": "addMenuItem",
+                    "type": "",
+                    "desc": "Adds a menu item.",
+                    "params": [{"name": "arg", "type": "Object", "object_schema": ACTION_SCHEMA}],
+                },
+                {
+                    "name": "add",
+                    "type": "QString",
+                    "desc": "Adds a node.",
+                    "params": [
+                        {"name": "parentGroup", "type": "QString", "desc": "The parent group."},
+                        {"name": "x", "type": "int", "default": "0"},
+                        {
+                            "name": "opts",
+                            "type": "QScriptValue",
+                            "default": "QScriptValue()",
+                            "desc": "Options.",
+                            "object_schema": [
+                                {"name": "name", "type": "String", "desc": "The name (required)"},
+                                {"name": "count", "type": "int", "desc": "How many"},
+                            ],
+                        },
+                    ],
+                },
+                {
+                    "name": "info",
+                    "type": "Object",
+                    "desc": "Node info.",
+                    "object_schema": [
+                        {"name": "path", "type": "String", "desc": "The path"},
+                        {"name": "children", "type": "string[]", "desc": "Child paths"},
+                    ],
+                },
+            ],
+        }
+    )
+    message_log = ClassInfo.from_dict(
+        {
+            "name": "MessageLog",
+            "is_namespace": True,
+            "desc": "The log.",
+            "slots": [
+                {
+                    "name": "format",
+                    "type": "String",
+                    "desc": "Formats.",
+                    "params": [
+                        {
+                            "name": "parts",
+                            "type": "Object",
+                            "object_schema": [
+                                {"name": "text", "type": "String", "desc": "Text"},
+                                {"name": "level", "type": "int"},
+                            ],
+                        }
+                    ],
+                }
+            ],
+        }
+    )
+    options = Member.from_dict(
+        {
+            "name": "Opts",
+            "desc": "Options.",
+            "object_schema": [
+                {"name": "a", "type": "string[]", "desc": "the a"},
+                {"name": "b", "type": "number", "desc": "b"},
+                {"name": "c", "type": "{[key: string] : number}"},
+            ],
+        }
+    )
+    return render_class(script_manager) + render_class(message_log) + render_interface(options)
+
+
+def _prettier_available() -> bool:
+    # What `npx prettier` runs without downloading anything.
+    repo_bin = Path(__file__).parent.parent / "node_modules" / ".bin" / "prettier"
+    return shutil.which("npx") is not None and (repo_bin.exists() or shutil.which("prettier") is not None)
+
+
+def test_doc_comment_after_member_without_separator():
+    text = "declare interface Opts {\n/**\n* the a\n*/\na:string[]\n/**\n* b\n*/\nb:number}"
+    assert format_typescript(text) == (
+        "declare interface Opts {\n"
+        "  /**\n"
+        "   * the a\n"
+        "   */\n"
+        "  a: string[];\n"
+        "  /**\n"
+        "   * b\n"
+        "   */\n"
+        "  b: number;\n"
+        "}\n"
+    )
+
+
+def test_object_schemas_match_prettier():
+    assert format_typescript(builder_output()) == GOLDEN.read_text()
+
+
+def test_golden_is_prettier_output(tmp_path):
+    if not _prettier_available():
+        pytest.skip("prettier is not installed")
+    path = tmp_path / "index.d.ts"
+    path.write_text(builder_output())
+    repo_root = Path(__file__).parent.parent
+    subprocess.run(_prettier_command("--write", str(path)), check=True, capture_output=True, cwd=repo_root)
+    assert path.read_text() == GOLDEN.read_text()
@@ -0,0 +1,79 @@
+import pytest
+
+from tba_types_generator.type_expr import convert_type, jsdoc_to_ts, split_function_name
+
+FUNCTION = "(...args: any[]) => any"
+
+
+@pytest.mark.parametrize(
+    "jsdoc, expected",
+    [
+        ("string", "string"),
+        ("$.oNode", "$.oNode"),
+        ("Object", "Object"),
+        # Arrays and nested generics
+        ("Array", "any[]"),
+        ("Array.<string>", "string[]"),
+        ("Array<string>", "string[]"),
+        ("Array.<Array.<number>>", "number[][]"),
+        ("string[][]", "string[][]"),
+        ("Promise.<Array.<$.oColumn>>", "Promise<$.oColumn[]>"),
+        # Unions
+        ("string|Array.<string>", "string | string[]"),
+        ("string|null|undefined", "string | null | undefined"),
+        ("Array.<(string|number)>", "(string | number)[]"),
+        ("(string|number)[]", "(string | number)[]"),
+        # Records
+        ("Object.<string, number>", "{[key: string] : number}"),
+        ("Object.<string, Array.<$.oNode>>", "{[key: string] : $.oNode[]}"),
+        ("Map.<string, Object.<string, number>>", "Map<string, {[key: string] : number}>"),
+        ("{x: number, y: number}", "{x: number, y: number}"),
+        # Function types
+        ("function", FUNCTION),
+        ("function|null", f"({FUNCTION}) | null"),
+        ("Array.<function>", f"({FUNCTION})[]"),
+        ("Array.<string|function>", f"(string | ({FUNCTION}))[]"),
+        ("boolean|function", "boolean | ((...args: any[]) => boolean)"),
+        ("boolean | function", "boolean | ((...args: any[]) => boolean)"),
+        # Not a type expression: left as is
+        ("Array.<string", "Array.<string"),
+    ],
+)
+def test_jsdoc_to_ts(jsdoc, expected):
+    assert jsdoc_to_ts(jsdoc) == expected
+
+
+@pytest.mark.parametrize(
+    "doxygen, expected",
+    [
+        ("QString", "QString"),
+        ("bool", "boolean"),
+        ("String", "string"),
+        ("unsigned int", "int"),
+        ("integer", "int"),
+        ("double &", "double"),
+        ("QScriptValue *", "QScriptValue"),
+        ("virtual bool", "boolean"),
+        ("static double", "double"),
+        ("...", "any"),
+        ("", "void"),
+        ("int or QString", "int|QString"),
+        ("QList<QString>", "QList<QString>"),
+    ],
+)
+def test_convert_type(doxygen, expected):
+    assert convert_type(doxygen) == expected
+
+
+@pytest.mark.parametrize(
+    "memname, expected",
+    [
+        ("QString Foo::name", ("QString", "name", None)),
+        ("virtual bool node::isGroup", ("bool", "isGroup", "virtual")),
+        ("static int column::count", ("int", "count", "static")),
+        ("Foo::Foo", ("void", "Foo", None)),
+        ("Q_INVOKABLE double scene::fps", ("double", "fps", None)),
+    ],
+)
+def test_split_function_name(memname, expected):
+    assert split_function_name(memname) == expected